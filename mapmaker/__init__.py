@@ -22,7 +22,7 @@ __version__ = '1.0.0b1'
 
 #===============================================================================
 
-FLATMAP_VERSION  = 1.2
+FLATMAP_VERSION  = 1.3
 
 #===============================================================================
 
@@ -71,9 +71,21 @@ def main():
     zoom_options.add_argument('--min-zoom', dest='minZoom', metavar='N', type=int, default=2,
                         help='minimum zoom level (defaults to 2)')
 
+    output_options = parser.add_argument_group('output')
+    output_options.add_argument('--generalise', action='store_true',
+                        help='simplify feature geometries to suit each zoom level')
+    output_options.add_argument('--precision', dest='coordinatePrecision', metavar='N', type=int,
+                        help='decimal places in GeoJSON coordinates (defaults to a value based on maximum zoom)')
+    output_options.add_argument('--slim-tiles', dest='slimTiles', action='store_true',
+                        help='only keep properties needed for styling in vector tiles, saving all properties with feature annotations')
+
     misc_options = parser.add_argument_group('miscellaneous')
+    misc_options.add_argument('--jobs', dest='jobs', metavar='N', type=int, default=1,
+                        help='number of processes used to process the groups of SVG sources and the slides of PowerPoint sources (defaults to 1)')
     misc_options.add_argument('--refresh-labels', dest='refreshLabels', action='store_true',
                         help='Clear the label text cache before map making')
+    misc_options.add_argument('--stream-svg', dest='streamSVG', action='store_true',
+                        help='parse SVG sources incrementally, to limit memory used by very large files')
     misc_options.add_argument('--upload', dest='uploadHost', metavar='USER@SERVER',
                         help='Upload generated map to server')
 
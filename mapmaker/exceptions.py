@@ -19,7 +19,8 @@
 #===============================================================================
 
 class GroupValueError(ValueError):
-    def __init__(self, msg, features):
+    def __init__(self, msg, features=()):
+        # ``features`` is optional so that errors raised in worker processes can be unpickled
         super().__init__('\n  '.join([msg] + [str(f) for f in features]))
 
 #===============================================================================
@@ -18,15 +18,86 @@
 #
 #===============================================================================
 
-from typing import Any
+from typing import Any, Union
 
+import shapely.geometry
 from shapely.geometry.base import BaseGeometry
 
 #===============================================================================
 
+class GeometryGroup(object):
+    """
+    The geometries of a group's members, held by reference and only combined
+    into a single ``MultiPolygon`` or ``MultiLineString`` when needed.
+
+    Provides enough of the ``shapely`` geometry interface for a group to be
+    measured and serialised part by part.
+
+    :param geom_type: either ``MultiPolygon`` or ``MultiLineString``
+    :type geom_type: str
+    :param parts: the member geometries
+    :type parts: list(:class:`shapely.geometry.base.BaseGeometry`)
+    """
+    def __init__(self, geom_type: str, parts: list):
+        self.__geom_type = geom_type
+        self.__parts = parts
+
+    def __bool__(self):
+        return len(self.__parts) > 0
+
+    def __iter__(self):
+        return iter(self.__parts)
+
+    def __len__(self):
+        return len(self.__parts)
+
+    @property
+    def area(self) -> float:
+        return sum(part.area for part in self.__parts)
+
+    @property
+    def bounds(self) -> tuple:
+        bounds = [part.bounds for part in self.__parts]
+        return (min(b[0] for b in bounds), min(b[1] for b in bounds),
+                max(b[2] for b in bounds), max(b[3] for b in bounds))
+
+    @property
+    def centroid(self) -> shapely.geometry.Point:
+        if self.__geom_type == 'MultiPolygon':
+            weights = [part.area for part in self.__parts]
+        else:
+            weights = [part.length for part in self.__parts]
+        total = sum(weights)
+        if total == 0:
+            return self.materialise().centroid
+        centroids = [part.centroid.coords[0] for part in self.__parts]
+        return shapely.geometry.Point(sum(w*c[0] for (w, c) in zip(weights, centroids))/total,
+                                      sum(w*c[1] for (w, c) in zip(weights, centroids))/total)
+
+    @property
+    def geom_type(self) -> str:
+        return self.__geom_type
+
+    @property
+    def length(self) -> float:
+        return sum(part.length for part in self.__parts)
+
+    @property
+    def parts(self) -> list:
+        return self.__parts
+
+    def materialise(self) -> BaseGeometry:
+    #=====================================
+        if self.__geom_type == 'MultiPolygon':
+            return shapely.geometry.MultiPolygon(self.__parts)
+        else:
+            return shapely.geometry.MultiLineString(self.__parts)
+
+#===============================================================================
+
 class Feature(object):
     def __init__(self, feature_id: int,
-                       geometry: BaseGeometry,
+                       geometry: Union[BaseGeometry, GeometryGroup],
                        properties: dict,
                        has_children:bool=False):
         self.__feature__id = feature_id     # Must be numeric for tipeecanoe
@@ -35,6 +106,7 @@ class Feature(object):
         self.__properties['featureId'] = feature_id   # Used by flatmap viewer
         self.__properties['geometry'] = geometry.geom_type
         self.__has_children = has_children
+        self.__topology = None
 
     def __str__(self):
         return 'Feature {}: {}'.format(self.__geometry.geom_type, self.__properties)
@@ -43,22 +115,64 @@ class Feature(object):
     def feature_id(self) -> int:
         return self.__feature__id
 
+    @feature_id.setter
+    def feature_id(self, feature_id: int):
+        # Features made by a worker process are renumbered when merged into the flatmap
+        self.__feature__id = feature_id
+        self.__properties['featureId'] = feature_id
+
     @property
     def geom_type(self) -> str:
         return self.__geometry.geom_type if self.__geometry else None
 
     @property
     def geometry(self) -> BaseGeometry:
+        if isinstance(self.__geometry, GeometryGroup):
+            # Not kept, so that a group's vertices aren't duplicated
+            return self.__geometry.materialise()
         return self.__geometry
 
     @geometry.setter
     def geometry(self, geometry: BaseGeometry):
         self.__geometry = geometry
+        self.__topology = None
+
+    @property
+    def geometry_group(self) -> GeometryGroup:
+        """
+        The feature's :class:`GeometryGroup`, or ``None`` if it has an ordinary geometry.
+        """
+        return self.__geometry if isinstance(self.__geometry, GeometryGroup) else None
+
+    @property
+    def geometry_parts(self) -> list:
+        """
+        The parts of a multi-part geometry, without combining a group's members.
+        """
+        if isinstance(self.__geometry, GeometryGroup):
+            return self.__geometry.parts
+        return list(self.__geometry)
 
     @property
     def has_children(self) -> bool:
         return self.__has_children
 
+    @property
+    def topology(self):
+        """
+        The :class:`~mapmaker.geometry.topology.PolygonReference` the feature's
+        geometry was formed from, if any. Cleared when the geometry is changed.
+        """
+        return self.__topology
+
+    @topology.setter
+    def topology(self, reference):
+        self.__topology = reference
+
+    @property
+    def has_geometry(self) -> bool:
+        return self.__geometry is not None
+
     @property
     def id(self) -> str:
         return self.__properties.get('id')
@@ -18,7 +18,12 @@
 #
 #===============================================================================
 
+from collections import defaultdict
+
+#===============================================================================
+
 import shapely.geometry
+from shapely.strtree import STRtree
 
 #===============================================================================
 
@@ -26,6 +31,9 @@ from mapmaker import MIN_ZOOM
 from mapmaker.exceptions import GroupValueError
 from mapmaker.geometry import connect_dividers, extend_line, make_boundary
 from mapmaker.geometry import save_geometry
+from mapmaker.geometry.topology import Topology
+
+from .feature import GeometryGroup
 
 #===============================================================================
 
@@ -40,7 +48,7 @@ class FeatureLayer(object):
         self.__features = []
         self.__features_by_id = {}
         self.__detail_features = []
-        self.__feature_types = []
+        self.__feature_types = defaultdict(int)
 #*        self.__ontology_data = self.options.ontology_data
         self.__base_layer = base_layer
         self.__queryable_nodes = False
@@ -129,9 +137,7 @@ class FeatureLayer(object):
         self.__features_by_id[feature.feature_id] = feature
         if feature.has_property('details'):
             self.__detail_features.append(feature)
-        self.__feature_types.append({
-            'type': feature.get_property('geometry')
-        })
+        self.__feature_types[feature.get_property('geometry')] += 1
 
     def add_raster_layer(self, id, extent, map_source, min_zoom=MIN_ZOOM, local_world_to_base=None):
     #===============================================================================================
@@ -262,15 +268,25 @@ class FeatureLayer(object):
                 if debug_group:
                     save_geometry(polygon_boundaries, 'polygon_boundaries.wkt')
 
-                polygons = list(shapely.ops.polygonize(polygon_boundaries))
+                # Regions share their edges, so keep them as a topology
+                topology = Topology(polygon_boundaries)
+
+                # Index region points to find those within each polygon
+                region_points = [region.geometry for region in regions]
+                region_index = { id(point): n for (n, point) in enumerate(region_points) }
+                region_tree = STRtree(region_points)
 
-                for n, polygon in enumerate(polygons):
+                for n, polygon in enumerate(topology.polygons):
                     prepared_polygon = shapely.prepared.prep(polygon)
                     region_id = None
                     region_properties = base_properties.copy()
-                    for region in filter(lambda p: prepared_polygon.contains(p.geometry), regions):
+                    nearby_regions = [regions[i] for i in sorted(region_index[id(point)]
+                                                    for point in region_tree.query(polygon))]
+                    for region in filter(lambda p: prepared_polygon.contains(p.geometry), nearby_regions):
                         region_properties.update(region.properties)
-                        group_features.append(self.__flatmap.new_feature(polygon, region_properties))
+                        region_feature = self.__flatmap.new_feature(polygon, region_properties)
+                        region_feature.topology = topology.reference(n)
+                        group_features.append(region_feature)
                         break
         else:
             for feature in features:
@@ -283,13 +299,21 @@ class FeatureLayer(object):
                 if feature.geom_type == 'Polygon':
                     interior_polygons.append(feature.geometry)
                 elif feature.geom_type == 'MultiPolygon':
-                    interior_polygons.extend(list(feature.geometry))
-            interior_polygon = shapely.ops.unary_union(interior_polygons)
+                    interior_polygons.extend(feature.geometry_parts)
+            # Only subtract the interior polygons that overlap a feature
+            interior_index = { id(polygon): n for (n, polygon) in enumerate(interior_polygons) }
+            interior_tree = STRtree(interior_polygons)
             for feature in group_features:
                 if (feature.has_property('markup')
                 and feature.get_property('exterior')
                 and feature.geom_type in ['Polygon', 'MultiPolygon']):
-                    feature.geometry = feature.geometry.buffer(0).difference(interior_polygon)
+                    overlapping = sorted(interior_index[id(polygon)]
+                                            for polygon in interior_tree.query(feature.geometry))
+                    geometry = feature.geometry.buffer(0)
+                    if len(overlapping):
+                        geometry = geometry.difference(shapely.ops.unary_union(
+                                        [interior_polygons[n] for n in overlapping]))
+                    feature.geometry = geometry
 
         # Construct a MultiPolygon containing all of the group's polygons
         # But only if the group contains a `.group` element...
@@ -306,10 +330,10 @@ class FeatureLayer(object):
                     if feature.geom_type == 'LineString':
                         grouped_lines.append(feature.geometry)
                     elif feature.geom_type == 'MultiLineString':
-                        grouped_lines.extend(list(feature.geometry))
+                        grouped_lines.extend(feature.geometry_parts)
             if len(grouped_lines):
                 feature_group = self.__flatmap.new_feature(
-                      shapely.geometry.MultiLineString(grouped_lines),
+                      GeometryGroup('MultiLineString', grouped_lines),
                       grouped_properties, True)
                 group_features.append(feature_group)
             grouped_polygons = []
@@ -317,10 +341,10 @@ class FeatureLayer(object):
                 if feature.geom_type == 'Polygon':
                     grouped_polygons.append(feature.geometry)
                 elif feature.geom_type == 'MultiPolygon':
-                    grouped_polygons.extend(list(feature.geometry))
+                    grouped_polygons.extend(feature.geometry_parts)
             if len(grouped_polygons):
                 feature_group = self.__flatmap.new_feature(
-                        shapely.geometry.MultiPolygon(grouped_polygons),
+                        GeometryGroup('MultiPolygon', grouped_polygons),
                         grouped_properties, True)
                 group_features.append(feature_group)
 
@@ -332,7 +356,7 @@ class FeatureLayer(object):
             default_properties['class'] = child_class
 
         for feature in group_features:
-            if feature.geometry is not None:
+            if feature.has_geometry:
                 for (key, value) in default_properties.items():
                     if not feature.has_property(key):
                         feature.set_property(key, value)
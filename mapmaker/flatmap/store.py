@@ -0,0 +1,208 @@
+#===============================================================================
+#
+#  Flatmap viewer and annotation tools
+#
+#  Copyright (c) 2020  David Brooks
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+#===============================================================================
+
+"""
+Features with their coordinates held in contiguous arrays.
+
+A store is a temporary copy of the coordinates of a list of features, made
+so that a transform or projection of them all is a single array operation.
+Features keep their own ``shapely`` geometries, which are still changed in
+place as layers are processed, so the store doesn't replace them and whilst
+it exists their coordinates are held twice.
+"""
+
+#===============================================================================
+
+import numpy as np
+
+import shapely.geometry
+
+#===============================================================================
+
+from .feature import GeometryGroup
+
+#===============================================================================
+
+# Geometry types, indexed by their codes in the store
+GEOMETRY_TYPES = [
+    'Point',
+    'LineString',
+    'Polygon',
+    'MultiPoint',
+    'MultiLineString',
+    'MultiPolygon',
+    'GeometryCollection',
+]
+
+POINT = GEOMETRY_TYPES.index('Point')
+LINESTRING = GEOMETRY_TYPES.index('LineString')
+POLYGON = GEOMETRY_TYPES.index('Polygon')
+
+#===============================================================================
+
+def geometry_parts(geometry):
+#============================
+    """
+    :returns: The points, lines and polygons making up a geometry.
+    :rtype: list(:class:`shapely.geometry.base.BaseGeometry`)
+    """
+    if hasattr(geometry, 'geoms'):
+        return [part for geom in geometry.geoms for part in geometry_parts(geom)]
+    return [geometry]
+
+#===============================================================================
+
+class FeatureStore(object):
+    """
+    The geometries of a list of features, stored by column.
+
+    All coordinates are held in a single ``(N, 2)`` array. Each feature's
+    geometry is a range of parts, each part a range of rings (a polygon's
+    exterior followed by its interiors, or the coordinates of a line or point),
+    and each ring a range of coordinates. Geometries are only built as
+    ``shapely`` objects when they are asked for, so that operations on all
+    coordinates, such as transforms and projections, are single array
+    operations.
+
+    :param features: the features to store
+    :type features: list(:class:`~mapmaker.flatmap.feature.Feature`)
+    """
+    def __init__(self, features=None):
+        if features is None:
+            return
+        coordinates = []
+        ring_offsets = [0]
+        part_offsets = [0]
+        part_types = []
+        geometry_offsets = [0]
+        geometry_types = []
+        groups = []
+        feature_ids = []
+        size = 0
+        def add_ring(coords):
+            nonlocal size
+            array = np.array(coords, dtype=float)
+            coordinates.append(array[:, :2])
+            size += len(array)
+            ring_offsets.append(size)
+        for feature in features:
+            group = feature.geometry_group
+            if group is not None:
+                geom_type = group.geom_type
+                parts = group.parts
+            else:
+                geometry = feature.geometry
+                geom_type = geometry.geom_type
+                parts = geometry_parts(geometry)
+            for part in parts:
+                if part.is_empty:
+                    continue
+                part_type = part.geom_type
+                if part_type == 'Polygon':
+                    add_ring(part.exterior.coords)
+                    for ring in part.interiors:
+                        add_ring(ring.coords)
+                elif part_type in ['Point', 'LineString', 'LinearRing']:
+                    add_ring(part.coords)
+                    part_type = 'LineString' if part_type == 'LinearRing' else part_type
+                else:
+                    raise TypeError('Unsupported geometry part type: {}'.format(part_type))
+                part_types.append(GEOMETRY_TYPES.index(part_type))
+                part_offsets.append(len(ring_offsets) - 1)
+            geometry_types.append(GEOMETRY_TYPES.index('LineString' if geom_type == 'LinearRing'
+                                                                    else geom_type))
+            geometry_offsets.append(len(part_types))
+            groups.append(group is not None)
+            feature_ids.append(feature.feature_id)
+        self.__arrays = {
+            'coordinates': (np.concatenate(coordinates) if len(coordinates)
+                            else np.empty((0, 2), dtype=float)),
+            'ring_offsets': np.array(ring_offsets, dtype=np.int64),
+            'part_offsets': np.array(part_offsets, dtype=np.int64),
+            'part_types': np.array(part_types, dtype=np.int8),
+            'geometry_offsets': np.array(geometry_offsets, dtype=np.int64),
+            'geometry_types': np.array(geometry_types, dtype=np.int8),
+            'groups': np.array(groups, dtype=bool),
+            'feature_ids': np.array(feature_ids, dtype=np.int64),
+        }
+
+    def __len__(self):
+        return len(self.__arrays['feature_ids'])
+
+    def geometry(self, index):
+    #=========================
+        """
+        Build the geometry of a feature from the stored coordinates.
+
+        :param index: the feature's position in the store
+        :type index: int
+        :returns: The feature's geometry, as a :class:`~mapmaker.flatmap.feature.GeometryGroup`
+                  if the feature was a group.
+        """
+        geometry_type = GEOMETRY_TYPES[self.__arrays['geometry_types'][index]]
+        part_range = range(self.__arrays['geometry_offsets'][index],
+                           self.__arrays['geometry_offsets'][index+1])
+        parts = [self.__part(n) for n in part_range]
+        if self.__arrays['groups'][index]:
+            return GeometryGroup(geometry_type, parts)
+        elif geometry_type in ['Point', 'LineString', 'Polygon']:
+            return parts[0] if len(parts) else getattr(shapely.geometry, geometry_type)()
+        return getattr(shapely.geometry, geometry_type)(parts)
+
+    def geometries(self):
+    #====================
+        """
+        Iterate over the features' geometries, building each one as needed.
+        """
+        for index in range(len(self)):
+            yield self.geometry(index)
+
+    def transform(self, function):
+    #=============================
+        """
+        Apply a coordinate function, such as an affine transform or projection,
+        to the coordinates of all features in a single operation.
+
+        :param function: maps an ``(N, 2)`` coordinate array to another
+        :returns: A store with the transformed coordinates, sharing all other
+                  arrays with this store.
+        :rtype: :class:`FeatureStore`
+        """
+        store = FeatureStore()
+        store.__arrays = self.__arrays.copy()
+        if len(self.__arrays['coordinates']):
+            store.__arrays['coordinates'] = function(self.__arrays['coordinates'])
+        return store
+
+    def __part(self, index):
+    #=======================
+        part_type = self.__arrays['part_types'][index]
+        coordinates = self.__arrays['coordinates']
+        ring_offsets = self.__arrays['ring_offsets']
+        rings = [coordinates[ring_offsets[n]:ring_offsets[n+1]]
+                    for n in range(self.__arrays['part_offsets'][index],
+                                   self.__arrays['part_offsets'][index+1])]
+        if part_type == POLYGON:
+            return shapely.geometry.Polygon(rings[0], rings[1:])
+        elif part_type == LINESTRING:
+            return shapely.geometry.LineString(rings[0])
+        return shapely.geometry.Point(rings[0][0])
+
+#===============================================================================
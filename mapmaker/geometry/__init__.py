@@ -27,8 +27,8 @@ import pyproj
 
 import numpy as np
 
-from shapely.geometry import LineString, Polygon
-import shapely.affinity
+from shapely.geometry import LineString, MultiLineString, MultiPolygon, Polygon
+from shapely.strtree import STRtree
 import shapely.ops
 import shapely.wkt
 
@@ -36,12 +36,32 @@ import transforms3d
 
 #===============================================================================
 
+from mapmaker import MAX_ZOOM
+from mapmaker.settings import settings
+
+#===============================================================================
+
 END_MATCH_RATIO = 0.9
 ALMOST_TOUCHING = 500
 LINE_EXTENSION  = 100
 
 #===============================================================================
 
+# Width of the EPSG:3857 world in metres
+WORLD_WIDTH = 2*PI*6378137
+
+# Size of a displayed vector tile in pixels
+TILE_PIXELS = 512
+
+# Maximum distance, as a fraction of a pixel at the map's maximum zoom,
+# between a curve and the line segments that approximate it
+CURVE_TOLERANCE = 0.125
+
+# Limit on the number of line segments approximating a single curve segment
+MAX_CURVE_SEGMENTS = 1000
+
+#===============================================================================
+
 def save_geometry(geo, file):
 #============================
     with open(file, 'w') as fp:
@@ -61,19 +81,106 @@ warnings.simplefilter(action='default', category=FutureWarning)
 
 def bounds_to_extent(bounds):
 #============================
-    sw = mercator_transformer.transform(*bounds[:2])
-    ne = mercator_transformer.transform(*bounds[2:])
-    return (sw[0], sw[1], ne[0], ne[1])
+    (x, y) = mercator_transformer.transform([bounds[0], bounds[2]], [bounds[1], bounds[3]])
+    return (x[0], y[0], x[1], y[1])
 
 def extent_to_bounds(extent):
 #============================
-    sw = mercator_transformer.transform(*extent[:2], direction=pyproj.enums.TransformDirection.INVERSE)
-    ne = mercator_transformer.transform(*extent[2:], direction=pyproj.enums.TransformDirection.INVERSE)
-    return (sw[0], sw[1], ne[0], ne[1])
+    (x, y) = mercator_transformer.transform([extent[0], extent[2]], [extent[1], extent[3]],
+                                            direction=pyproj.enums.TransformDirection.INVERSE)
+    return (x[0], y[0], x[1], y[1])
 
 def mercator_transform(geometry):
 #================================
-    return shapely.ops.transform(mercator_transformer.transform, geometry)
+    return transform_coordinates(geometry, mercator_project)
+
+def mercator_project(coords):
+#============================
+    """
+    Project an ``(N, 2)`` array of world coordinates to longitude and latitude.
+    """
+    return np.column_stack(mercator_transformer.transform(coords[:, 0], coords[:, 1]))
+
+#===============================================================================
+
+def _coordinate_arrays(geometry, arrays):
+#========================================
+    if geometry.is_empty:
+        return
+    geom_type = geometry.geom_type
+    if geom_type == 'Polygon':
+        arrays.append(np.array(geometry.exterior.coords)[:, :2])
+        arrays.extend(np.array(ring.coords)[:, :2] for ring in geometry.interiors)
+    elif geom_type.startswith('Multi') or geom_type == 'GeometryCollection':
+        for part in geometry.geoms:
+            _coordinate_arrays(part, arrays)
+    else:
+        arrays.append(np.array(geometry.coords)[:, :2])
+
+def _rebuild_geometry(geometry, arrays):
+#=======================================
+    if geometry.is_empty:
+        # Empty geometries have no coordinates and are returned unchanged
+        return geometry
+    geom_type = geometry.geom_type
+    if geom_type == 'Polygon':
+        exterior = next(arrays)
+        return Polygon(exterior, [next(arrays) for _ in geometry.interiors])
+    elif geom_type == 'MultiPolygon':
+        # Building from coordinates avoids copying intermediate polygons
+        return MultiPolygon([(next(arrays), [next(arrays) for _ in polygon.interiors])
+                                for polygon in geometry.geoms])
+    elif geom_type == 'MultiLineString':
+        return MultiLineString([next(arrays) for _ in geometry.geoms])
+    elif geom_type.startswith('Multi') or geom_type == 'GeometryCollection':
+        return type(geometry)([_rebuild_geometry(part, arrays) for part in geometry.geoms])
+    elif geom_type == 'Point':
+        return type(geometry)(next(arrays)[0])
+    return type(geometry)(next(arrays))
+
+def transform_geometries(geometries, function):
+#==============================================
+    """
+    Apply a coordinate function to a list of geometries.
+
+    The coordinates of all of the geometries are passed to the function in a
+    single array, and each geometry is rebuilt once from the results.
+
+    :param geometries: the geometries to transform
+    :type geometries: list(:class:`shapely.geometry.base.BaseGeometry`)
+    :param function: maps an ``(N, 2)`` coordinate array to another
+    :returns: The transformed geometries.
+    :rtype: list(:class:`shapely.geometry.base.BaseGeometry`)
+    """
+    arrays = []
+    for geometry in geometries:
+        _coordinate_arrays(geometry, arrays)
+    if len(arrays) == 0:
+        return list(geometries)
+    sizes = [len(array) for array in arrays]
+    transformed = iter(np.split(function(np.concatenate(arrays)), np.cumsum(sizes)[:-1]))
+    return [_rebuild_geometry(geometry, transformed) for geometry in geometries]
+
+def transform_coordinates(geometry, function):
+#=============================================
+    """
+    Apply a coordinate function, such as a projection, to all of a
+    geometry's coordinates in a single call.
+
+    :param geometry: the geometry to transform
+    :type geometry: :class:`shapely.geometry.base.BaseGeometry`
+    :param function: maps an ``(N, 2)`` coordinate array to another
+    :rtype: :class:`shapely.geometry.base.BaseGeometry`
+    """
+    return transform_geometries([geometry], function)[0]
+
+def pixel_size(zoom):
+#====================
+    """
+    :returns: The size, in world metres, of a display pixel at a zoom level.
+    :rtype: float
+    """
+    return WORLD_WIDTH/(TILE_PIXELS*2**zoom)
 
 #===============================================================================
 
@@ -93,6 +200,9 @@ class Transform(object):
         self.__shapely_matrix = np.concatenate((self.__matrix[0, 0:2],
                                                 self.__matrix[1, 0:2],
                                                 self.__matrix[0:2, 2]), axis=None).tolist()
+        # Affine coefficients as floats, for transforming points without a matmul
+        (self.__a, self.__b, self.__d, self.__e, self.__xoff, self.__yoff) = self.__shapely_matrix
+        self.__decomposition = None
 
     def __matmul__(self, transform):
         if isinstance(transform, Transform):
@@ -115,9 +225,15 @@ class Transform(object):
     #=================
         return Transform(np.linalg.inv(self.__matrix))
 
+    def __decompose(self):
+    #=====================
+        if self.__decomposition is None:
+            self.__decomposition = transforms3d.affines.decompose(self.__matrix)
+        return self.__decomposition
+
     def rotate_angle(self, angle):
     #==============================
-        rotation = transforms3d.affines.decompose(self.__matrix)[1]
+        rotation = self.__decompose()[1]
         theta = acos(rotation[0, 0])
         if rotation[0, 1] >= 0:
             theta = 2*PI - theta
@@ -128,22 +244,39 @@ class Transform(object):
 
     def scale_length(self, length):
     #==============================
-        scaling = transforms3d.affines.decompose(self.__matrix)[2]
+        scaling = self.__decompose()[2]
         return (scaling[0]*length[0], scaling[1]*length[1])
 
     def transform_extent(self, extent):
     #==================================
         bounds = extent_to_bounds(extent)
-        return bounds_to_extent(
-            shapely.affinity.affine_transform(shapely.geometry.box(*bounds),
-                                              self.__shapely_matrix).bounds)
+        corners = self.transform_points([(bounds[0], bounds[1]), (bounds[2], bounds[1]),
+                                         (bounds[2], bounds[3]), (bounds[0], bounds[3])])
+        return bounds_to_extent((*corners.min(axis=0).tolist(), *corners.max(axis=0).tolist()))
+
     def transform_geometry(self, geometry):
     #======================================
-       return shapely.affinity.affine_transform(geometry, self.__shapely_matrix)
+       return transform_coordinates(geometry, self.transform_points)
 
     def transform_point(self, point):
     #================================
-        return (self.__matrix@[point[0], point[1], 1.0])[:2]
+        return np.array((self.__a*point[0] + self.__b*point[1] + self.__xoff,
+                         self.__d*point[0] + self.__e*point[1] + self.__yoff))
+
+    def transform_points(self, points):
+    #==================================
+        """
+        Transform a sequence of points in a single operation.
+
+        :param points: the points to transform
+        :type points: array_like of shape ``(N, 2)``
+        :rtype: :class:`numpy.ndarray` of shape ``(N, 2)``
+        """
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        x = points[:, 0]
+        y = points[:, 1]
+        return np.column_stack((self.__a*x + self.__b*y + self.__xoff,
+                                self.__d*x + self.__e*y + self.__yoff))
 
 #===============================================================================
 
@@ -153,9 +286,13 @@ class Identity(Transform):
 
 #===============================================================================
 
-def bezier_sample(bz, points=100):
-#=================================
-    return [(pt.x, pt.y) for pt in bz.sample(points)]
+def curve_tolerance():
+#=====================
+    """
+    :returns: The flattening tolerance, in world metres, for curves in the map.
+    :rtype: float
+    """
+    return CURVE_TOLERANCE*pixel_size(settings.get('maxZoom', MAX_ZOOM))
 
 #===============================================================================
 
@@ -200,6 +337,17 @@ def extend_line(geometry):
 
 #===============================================================================
 
+def expanded_bounds(bounds, distance):
+#=====================================
+    return (bounds[0] - distance, bounds[1] - distance, bounds[2] + distance, bounds[3] + distance)
+
+def bounds_intersect(bounds1, bounds2):
+#======================================
+    return (bounds1[0] <= bounds2[2] and bounds2[0] <= bounds1[2]
+        and bounds1[1] <= bounds2[3] and bounds2[1] <= bounds1[3])
+
+#===============================================================================
+
 class LineMatcher(object):
     def __init__(self, first_line):
         self._previous = LineString(first_line)
@@ -245,17 +393,51 @@ class LineMatcher(object):
 
 #===============================================================================
 
+class LineEndIndex(object):
+    """
+    Find the lines that may intersect a line or have an end point within
+    ``ALMOST_TOUCHING`` of the line's end.
+    """
+    def __init__(self, lines):
+        geometries = []
+        self.__geometry_index = {}
+        for (n, line) in enumerate(lines):
+            coords = line.coords
+            for geometry in [shapely.geometry.box(*line.bounds),
+                             shapely.geometry.Point(coords[0]),
+                             shapely.geometry.Point(coords[-1])]:
+                self.__geometry_index[id(geometry)] = n
+                geometries.append(geometry)
+        self.__geometries = geometries
+        self.__tree = STRtree(geometries)
+
+    def neighbours(self, line, remaining):
+    #=====================================
+        """
+        :returns: Indices, in order, of remaining lines that are near ``line``.
+        """
+        end = line.coords[-1]
+        bounds = expanded_bounds((end[0], end[1], end[0], end[1]), ALMOST_TOUCHING)
+        candidates = set(self.__geometry_index[id(geometry)]
+                            for geometry in (self.__tree.query(shapely.geometry.box(*line.bounds))
+                                           + self.__tree.query(shapely.geometry.box(*bounds))))
+        return sorted(candidates & remaining)
+
+#===============================================================================
+
 def make_boundary(lines):
+    # Only lines that intersect the boundary being built, or that are close
+    # to its end, can extend it, so use a spatial index to find them
     line_matcher = LineMatcher(lines[0])
-    remainder = lines[1:]
-    while len(remainder) > 0:
-        for (n, line) in enumerate(remainder):
-            if line_matcher.extend(line):
-                del remainder[n]
+    index = LineEndIndex(lines)
+    remaining = set(range(1, len(lines)))
+    while len(remaining) > 0:
+        for n in index.neighbours(line_matcher.previous, remaining):
+            if line_matcher.extend(lines[n]):
+                remaining.remove(n)
                 break
-            else:
-                if n == (len(remainder) - 1):
-                    raise ValueError("Boundary segment doesn't have a close neighbour")
+        else:
+            raise ValueError("Boundary segment doesn't have a close neighbour")
     if line_matcher.extend(lines[0]):
         coords = line_matcher.coords
         if coords[0] != coords[-1]:
@@ -284,95 +466,145 @@ def endpoint(point, line):
 
 #===============================================================================
 
+class DividerIndex(object):
+    """
+    Find the dividers that may be within ``ALMOST_TOUCHING`` of a divider,
+    allowing for dividers that are extended as connections are made.
+    """
+    def __init__(self, dividers):
+        self.__dividers = dividers
+        boxes = [shapely.geometry.box(*divider.bounds) for divider in dividers]
+        self.__box_index = { id(box): n for (n, box) in enumerate(boxes) }
+        self.__boxes = boxes
+        self.__tree = STRtree(boxes)
+        self.__extended = set()
+
+    def extended(self, n):
+    #=====================
+        # The divider's geometry has changed, so its original box is no longer valid
+        self.__extended.add(n)
+
+    def neighbours(self, n, after):
+    #==============================
+        """
+        :returns: Indices, in order, of dividers after ``after`` that may be
+                  within ``ALMOST_TOUCHING`` of divider ``n``.
+        """
+        bounds = expanded_bounds(self.__dividers[n].bounds, ALMOST_TOUCHING)
+        candidates = set(self.__box_index[id(box)]
+                            for box in self.__tree.query(shapely.geometry.box(*bounds)))
+        candidates.update(self.__extended)
+        return sorted(m for m in candidates
+                        if m > after and bounds_intersect(bounds, self.__dividers[m].bounds))
+
+#===============================================================================
+
+def connect_divider_pair(dividers, n, m, connectors, debug):
+#===========================================================
+    divider1 = dividers[n]
+    divider2 = dividers[m]
+    if divider1.boundary.is_empty and divider2.boundary.is_empty:
+        nearest = shapely.ops.nearest_points(divider1, divider2)
+        distance = nearest[0].distance(nearest[1])
+        if 0 < distance <= ALMOST_TOUCHING:
+            connectors.append(extend_line(shapely.geometry.LineString(nearest)))
+            if debug: print(n, m, 'both rings: connect...')
+    elif divider1.boundary.is_empty or divider2.boundary.is_empty:
+        if divider1.boundary.is_empty:
+            half = shapely.ops.substring(divider2, 0.0, 0.5, True)
+            if not half.crosses(divider1):
+                endpoint = divider2.boundary[0]
+                nearest = shapely.ops.nearest_points(endpoint, divider1)
+                distance = nearest[0].distance(nearest[1])
+                if distance <= ALMOST_TOUCHING:
+                    dividers[m] = extend_divider(divider2, nearest[0], nearest[1])
+                    divider2 = dividers[m]
+                    if debug: print(n, m, '1st is ring: extend 2nd start...')
+            half = shapely.ops.substring(divider2, 0.5, 1.0, True)
+            if not half.crosses(divider1):
+                endpoint = divider2.boundary[1]
+                nearest = shapely.ops.nearest_points(endpoint, divider1)
+                distance = nearest[0].distance(nearest[1])
+                if distance <= ALMOST_TOUCHING:
+                    dividers[m] = extend_divider(divider2, nearest[0], nearest[1])
+                    divider2 = dividers[m]
+                    if debug: print(n, m, '1st is ring: extend 2nd end...')
+        if divider2.boundary.is_empty:
+            half = shapely.ops.substring(divider1, 0.0, 0.5, True)
+            if not half.crosses(divider2):
+                endpoint = divider1.boundary[0]
+                nearest = shapely.ops.nearest_points(endpoint, divider2)
+                distance = nearest[0].distance(nearest[1])
+                if distance <= ALMOST_TOUCHING:
+                    dividers[n] = extend_divider(divider1, nearest[0], nearest[1])
+                    divider1 = dividers[n]
+                    if debug: print(n, m, '2nd is ring: extend 1st start...')
+            half = shapely.ops.substring(divider1, 0.5, 1.0, True)
+            if not half.crosses(divider2):
+                endpoint = divider1.boundary[1]
+                nearest = shapely.ops.nearest_points(endpoint, divider2)
+                distance = nearest[0].distance(nearest[1])
+                if distance <= ALMOST_TOUCHING:
+                    dividers[n] = extend_divider(divider1, nearest[0], nearest[1])
+                    divider1 = dividers[n]
+                    if debug: print(n, m, '2nd is ring: extend 1st end...')
+    else:
+        # Order matters, process divider1 before divider2
+        half = shapely.ops.substring(divider1, 0.0, 0.5, True)
+        if not half.crosses(divider2):
+            endpoint = divider1.boundary[0]
+            nearest = shapely.ops.nearest_points(endpoint, divider2)
+            distance = nearest[0].distance(nearest[1])
+            if distance <= ALMOST_TOUCHING:
+                dividers[n] = extend_divider(divider1, nearest[0], nearest[1])
+                divider1 = dividers[n]
+                if debug: print(n, m, 'no rings: extend 1st start...')
+        half = shapely.ops.substring(divider1, 0.5, 1.0, True)
+        if not half.crosses(divider2):
+            endpoint = divider1.boundary[1]
+            nearest = shapely.ops.nearest_points(endpoint, divider2)
+            distance = nearest[0].distance(nearest[1])
+            if distance <= ALMOST_TOUCHING:
+                dividers[n] = extend_divider(divider1, nearest[0], nearest[1])
+                divider1 = dividers[n]
+                if debug: print(n, m, 'no rings: extend 1st end...')
+        half = shapely.ops.substring(divider2, 0.0, 0.5, True)
+        if not half.crosses(divider1):
+            endpoint = divider2.boundary[0]
+            nearest = shapely.ops.nearest_points(endpoint, divider1)
+            distance = nearest[0].distance(nearest[1])
+            if distance <= ALMOST_TOUCHING:
+                dividers[m] = extend_divider(divider2, nearest[0], nearest[1])
+                divider2 = dividers[m]
+                if debug: print(n, m, 'no rings: extend 2nd start...')
+        half = shapely.ops.substring(divider2, 0.5, 1.0, True)
+        if not half.crosses(divider1):
+            endpoint = divider2.boundary[1]
+            nearest = shapely.ops.nearest_points(endpoint, divider1)
+            distance = nearest[0].distance(nearest[1])
+            if distance <= ALMOST_TOUCHING:
+                dividers[m] = extend_divider(divider2, nearest[0], nearest[1])
+                divider2 = dividers[m]
+                if debug: print(n, m, 'no rings: extend 2nd end...')
+
 def connect_dividers(dividers, debug):
+#=====================================
+    # Only dividers within ``ALMOST_TOUCHING`` of each other can be connected,
+    # so use a spatial index to find which pairs to check
+    index = DividerIndex(dividers)
     connectors = []
     for n in range(len(dividers) - 1):
-        divider1 = dividers[n]
-        for m in range(n + 1, len(dividers)):
-            divider2 = dividers[m]
-            if divider1.boundary.is_empty and divider2.boundary.is_empty:
-                nearest = shapely.ops.nearest_points(divider1, divider2)
-                distance = nearest[0].distance(nearest[1])
-                if 0 < distance <= ALMOST_TOUCHING:
-                    connectors.append(extend_line(shapely.geometry.LineString(nearest)))
-                    if debug: print(n, m, 'both rings: connect...')
-            elif divider1.boundary.is_empty or divider2.boundary.is_empty:
-                if divider1.boundary.is_empty:
-                    half = shapely.ops.substring(divider2, 0.0, 0.5, True)
-                    if not half.crosses(divider1):
-                        endpoint = divider2.boundary[0]
-                        nearest = shapely.ops.nearest_points(endpoint, divider1)
-                        distance = nearest[0].distance(nearest[1])
-                        if distance <= ALMOST_TOUCHING:
-                            dividers[m] = extend_divider(divider2, nearest[0], nearest[1])
-                            divider2 = dividers[m]
-                            if debug: print(n, m, '1st is ring: extend 2nd start...')
-                    half = shapely.ops.substring(divider2, 0.5, 1.0, True)
-                    if not half.crosses(divider1):
-                        endpoint = divider2.boundary[1]
-                        nearest = shapely.ops.nearest_points(endpoint, divider1)
-                        distance = nearest[0].distance(nearest[1])
-                        if distance <= ALMOST_TOUCHING:
-                            dividers[m] = extend_divider(divider2, nearest[0], nearest[1])
-                            divider2 = dividers[m]
-                            if debug: print(n, m, '1st is ring: extend 2nd end...')
-                if divider2.boundary.is_empty:
-                    half = shapely.ops.substring(divider1, 0.0, 0.5, True)
-                    if not half.crosses(divider2):
-                        endpoint = divider1.boundary[0]
-                        nearest = shapely.ops.nearest_points(endpoint, divider2)
-                        distance = nearest[0].distance(nearest[1])
-                        if distance <= ALMOST_TOUCHING:
-                            dividers[n] = extend_divider(divider1, nearest[0], nearest[1])
-                            divider1 = dividers[n]
-                            if debug: print(n, m, '2nd is ring: extend 1st start...')
-                    half = shapely.ops.substring(divider1, 0.5, 1.0, True)
-                    if not half.crosses(divider2):
-                        endpoint = divider1.boundary[1]
-                        nearest = shapely.ops.nearest_points(endpoint, divider2)
-                        distance = nearest[0].distance(nearest[1])
-                        if distance <= ALMOST_TOUCHING:
-                            dividers[n] = extend_divider(divider1, nearest[0], nearest[1])
-                            divider1 = dividers[n]
-                            if debug: print(n, m, '2nd is ring: extend 1st end...')
-            else:
-                # Order matters, process divider1 before divider2
-                half = shapely.ops.substring(divider1, 0.0, 0.5, True)
-                if not half.crosses(divider2):
-                    endpoint = divider1.boundary[0]
-                    nearest = shapely.ops.nearest_points(endpoint, divider2)
-                    distance = nearest[0].distance(nearest[1])
-                    if distance <= ALMOST_TOUCHING:
-                        dividers[n] = extend_divider(divider1, nearest[0], nearest[1])
-                        divider1 = dividers[n]
-                        if debug: print(n, m, 'no rings: extend 1st start...')
-                half = shapely.ops.substring(divider1, 0.5, 1.0, True)
-                if not half.crosses(divider2):
-                    endpoint = divider1.boundary[1]
-                    nearest = shapely.ops.nearest_points(endpoint, divider2)
-                    distance = nearest[0].distance(nearest[1])
-                    if distance <= ALMOST_TOUCHING:
-                        dividers[n] = extend_divider(divider1, nearest[0], nearest[1])
-                        divider1 = dividers[n]
-                        if debug: print(n, m, 'no rings: extend 1st end...')
-                half = shapely.ops.substring(divider2, 0.0, 0.5, True)
-                if not half.crosses(divider1):
-                    endpoint = divider2.boundary[0]
-                    nearest = shapely.ops.nearest_points(endpoint, divider1)
-                    distance = nearest[0].distance(nearest[1])
-                    if distance <= ALMOST_TOUCHING:
-                        dividers[m] = extend_divider(divider2, nearest[0], nearest[1])
-                        divider2 = dividers[m]
-                        if debug: print(n, m, 'no rings: extend 2nd start...')
-                half = shapely.ops.substring(divider2, 0.5, 1.0, True)
-                if not half.crosses(divider1):
-                    endpoint = divider2.boundary[1]
-                    nearest = shapely.ops.nearest_points(endpoint, divider1)
-                    distance = nearest[0].distance(nearest[1])
-                    if distance <= ALMOST_TOUCHING:
-                        dividers[m] = extend_divider(divider2, nearest[0], nearest[1])
-                        divider2 = dividers[m]
-                        if debug: print(n, m, 'no rings: extend 2nd end...')
+        neighbours = index.neighbours(n, n)
+        while len(neighbours) > 0:
+            m = neighbours.pop(0)
+            (divider1, divider2) = (dividers[n], dividers[m])
+            connect_divider_pair(dividers, n, m, connectors, debug)
+            if dividers[m] is not divider2:
+                index.extended(m)
+            if dividers[n] is not divider1:
+                # Divider ``n`` may now be close to others
+                index.extended(n)
+                neighbours = index.neighbours(n, m)
     return dividers + connectors
 
 #===============================================================================
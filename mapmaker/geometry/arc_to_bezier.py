@@ -94,22 +94,32 @@ def arc_endpoints_to_centre(r, phi, flagA, flagS, p1, p2):
     return namedtuple('elliptical_arc',
         'centre, radii, theta, delta_theta')(c, r_abs, theta, delta_theta)
 
-def bezier_paths_from_arc_endpoints(r, phi, flagA, flagS, p1, p2, T):
-#====================================================================
+def bezier_control_points_from_arc_endpoints(r, phi, flagA, flagS, p1, p2, T=None):
+#==================================================================================
     arc = arc_endpoints_to_centre(r, phi, flagA, flagS, p1, p2)
     end_theta = arc.theta + arc.delta_theta
     t = arc.theta
     dt = math.pi/4
     segments = []
     while (t + dt) < end_theta:
-        control_points = (BezierPoint(*T.transform_point(cp))
-            for cp in cubic_bezier_control_points(arc.centre, arc.radii, phi, t, t + dt))
-        segments.append(CubicBezier(*control_points))
+        segments.append(list(cubic_bezier_control_points(arc.centre, arc.radii, phi, t, t + dt)))
         t += dt
-    control_points = (BezierPoint(*T.transform_point(cp))
-        for cp in cubic_bezier_control_points(arc.centre, arc.radii, phi, t, end_theta))
-    segments.append(CubicBezier(*(tuple(control_points)[:3]), BezierPoint(*T.transform_point(p2))))
-    path = BezierPath.fromSegments(segments)
+    control_points = cubic_bezier_control_points(arc.centre, arc.radii, phi, t, end_theta)
+    segments.append(list(control_points[:3]) + [p2])
+    if T is None:
+        return segments
+    # Transform all of the control points together
+    return list(T.transform_points(segments).reshape(-1, 4, 2))
+
+def bezier_paths_from_arc_endpoints(r, phi, flagA, flagS, p1, p2, T):
+#====================================================================
+    return bezier_path_from_control_points(
+        bezier_control_points_from_arc_endpoints(r, phi, flagA, flagS, p1, p2, T))
+
+def bezier_path_from_control_points(segments):
+#=============================================
+    path = BezierPath.fromSegments([CubicBezier(*[BezierPoint(*cp) for cp in control_points])
+                                        for control_points in segments])
     path.closed = False
     return path
 
@@ -0,0 +1,207 @@
+#===============================================================================
+#
+#  Flatmap viewer and annotation tools
+#
+#  Copyright (c) 2020  David Brooks
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+#===============================================================================
+
+"""
+Flatten Bezier curves into line segments, evaluating all of the curves of
+a path in a single batched ``numpy`` operation.
+"""
+
+#===============================================================================
+
+import numpy as np
+
+#===============================================================================
+
+from mapmaker.geometry import curve_tolerance, MAX_CURVE_SEGMENTS
+
+#===============================================================================
+
+def bezier_segment_counts(control_points, tolerance):
+#====================================================
+    """
+    The number of line segments needed to approximate Bezier curves to within
+    a tolerance, from Wang's formula.
+
+    :param control_points: the control points of curves of the same degree
+    :type control_points: :class:`numpy.ndarray` of shape ``(curves, degree+1, 2)``
+    :param tolerance: the maximum distance between a curve and its approximation
+    :type tolerance: float
+    :rtype: :class:`numpy.ndarray` of ``int``
+    """
+    degree = control_points.shape[1] - 1
+    if degree < 2:
+        return np.ones(len(control_points), dtype=int)
+    if tolerance <= 0:
+        return np.full(len(control_points), MAX_CURVE_SEGMENTS, dtype=int)
+    differences = control_points[:, 2:] - 2*control_points[:, 1:-1] + control_points[:, :-2]
+    max_difference = np.max(np.hypot(differences[..., 0], differences[..., 1]), axis=1)
+    counts = np.ceil(np.sqrt(degree*(degree - 1)*max_difference/(8*tolerance)))
+    return np.clip(counts, 1, MAX_CURVE_SEGMENTS).astype(int)
+
+def binomial_coefficients(degree):
+#=================================
+    # A row of Pascal's triangle (``math.comb`` needs Python 3.8)
+    row = [1]
+    for k in range(degree):
+        row = [1] + [a + b for (a, b) in zip(row[:-1], row[1:])] + [1]
+    return row
+
+def bernstein_terms(t, degree):
+#==============================
+    # Terms are evaluated in the same order as ``beziers`` so that results are identical
+    s = 1.0 - t
+    if degree == 3:
+        return [s*s*s, 3*s*s*t, 3*s*t*t, t*t*t]
+    elif degree == 2:
+        return [s*s, 2*s*t, t*t]
+    return [c*t**k*s**(degree - k) for (k, c) in enumerate(binomial_coefficients(degree))]
+
+def flatten_beziers(control_points, tolerance):
+#==============================================
+    """
+    Flatten Bezier curves of the same degree.
+
+    :param control_points: the control points of the curves
+    :type control_points: :class:`numpy.ndarray` of shape ``(curves, degree+1, 2)``
+    :param tolerance: the maximum distance between a curve and its approximation
+    :type tolerance: float
+    :returns: The points along each curve, including both its end points.
+    :rtype: list(:class:`numpy.ndarray`)
+    """
+    control_points = np.asarray(control_points, dtype=float)
+    if len(control_points) == 0:
+        return []
+    degree = control_points.shape[1] - 1
+    counts = bezier_segment_counts(control_points, tolerance)
+    sizes = counts + 1
+    offsets = np.cumsum(sizes) - sizes
+    curve_index = np.repeat(np.arange(len(counts)), sizes)
+    t = (np.arange(sizes.sum()) - offsets[curve_index])/counts[curve_index]
+    points = control_points[curve_index]
+    coords = None
+    for (k, term) in enumerate(bernstein_terms(t, degree)):
+        weighted = term[:, np.newaxis]*points[:, k]
+        coords = weighted if coords is None else coords + weighted
+    return np.split(coords, offsets[1:])
+
+#===============================================================================
+
+class PathBuilder(object):
+    """
+    Collect the points and Bezier curves of a path, in order, and then
+    transform all of the path's points and flatten all of its curves
+    together when its coordinates are wanted.
+
+    :param transform: the transform from source to world coordinates, if
+                      points are not already in world coordinates
+    :type transform: :class:`~mapmaker.geometry.Transform`
+    :param tolerance: the flattening tolerance, defaults to
+                      :func:`~mapmaker.geometry.curve_tolerance`
+    :type tolerance: float
+    """
+    def __init__(self, transform=None, tolerance=None):
+        self.__tolerance = curve_tolerance() if tolerance is None else tolerance
+        self.__points = []
+        self.__transforms = [(0, transform)]
+        self.__pieces = []
+        self.__curves = {}
+
+    @property
+    def transform(self):
+        return self.__transforms[-1][1]
+
+    @transform.setter
+    def transform(self, transform):
+        # Points added from now on use the new transform
+        if self.__transforms[-1][0] == len(self.__points):
+            self.__transforms[-1] = (len(self.__points), transform)
+        else:
+            self.__transforms.append((len(self.__points), transform))
+
+    def with_transform(self, transform):
+    #===================================
+        """
+        Use the same path with another transform, without copying it.
+
+        :returns: A builder that shares this builder's points and curves, which
+                  should no longer be added to.
+        :rtype: :class:`PathBuilder`
+        """
+        builder = PathBuilder(transform, self.__tolerance)
+        builder.__points = self.__points
+        builder.__pieces = self.__pieces
+        builder.__curves = self.__curves
+        return builder
+
+    def add_point(self, point):
+    #==========================
+        self.__pieces.append((None, len(self.__points)))
+        self.__points.append((point[0], point[1]))
+
+    def add_bezier(self, control_points, continued=False):
+    #=====================================================
+        """
+        :param control_points: the curve's control points
+        :param continued: the curve starts where the previous one ended, so
+                          don't repeat its first point
+        """
+        curves = self.__curves.setdefault(len(control_points), [])
+        self.__pieces.append((len(control_points), (len(curves), continued)))
+        curves.append(range(len(self.__points), len(self.__points) + len(control_points)))
+        self.__points.extend((pt[0], pt[1]) for pt in control_points)
+
+    def add_beziers(self, curves):
+    #=============================
+        """
+        Add a sequence of joined curves.
+        """
+        for (n, control_points) in enumerate(curves):
+            self.add_bezier(control_points, n > 0)
+
+    def coordinates(self):
+    #=====================
+        """
+        :returns: The path's points with all curves flattened.
+        :rtype: list(tuple(float, float))
+        """
+        world_points = self.__world_points()
+        flattened = { size: flatten_beziers(world_points[np.array(curves)], self.__tolerance)
+                        for (size, curves) in self.__curves.items() }
+        parts = []
+        for (size, piece) in self.__pieces:
+            if size is None:
+                parts.append(world_points[piece:piece+1])
+            else:
+                points = flattened[size][piece[0]]
+                parts.append(points[1:] if piece[1] else points)
+        if len(parts) == 0:
+            return []
+        return [tuple(pt) for pt in np.concatenate(parts).tolist()]
+
+    def __world_points(self):
+    #========================
+        points = np.array(self.__points, dtype=float).reshape(-1, 2)
+        ends = [start for (start, _) in self.__transforms[1:]] + [len(points)]
+        for ((start, transform), end) in zip(self.__transforms, ends):
+            if transform is not None and end > start:
+                points[start:end] = transform.transform_points(points[start:end])
+        return points
+
+#===============================================================================
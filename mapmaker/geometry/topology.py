@@ -0,0 +1,188 @@
+#===============================================================================
+#
+#  Flatmap viewer and annotation tools
+#
+#  Copyright (c) 2020  David Brooks
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+#===============================================================================
+
+"""
+Polygons formed by a network of lines, with each edge shared by neighbouring
+polygons stored once as an *arc*, in the manner of TopoJSON.
+"""
+
+#===============================================================================
+
+from collections import defaultdict
+
+#===============================================================================
+
+import numpy as np
+
+import shapely.geometry
+import shapely.ops
+
+#===============================================================================
+
+class PolygonReference(object):
+    """
+    A polygon in a :class:`Topology`.
+    """
+    def __init__(self, topology, index):
+        self.__topology = topology
+        self.__index = index
+
+    @property
+    def index(self):
+        return self.__index
+
+    @property
+    def topology(self):
+        return self.__topology
+
+    def geometry(self, tolerance=0, projection=None):
+    #===============================================
+        return self.__topology.polygon(self.__index, tolerance, projection)
+
+#===============================================================================
+
+class Topology(object):
+    """
+    The polygons formed by a network of noded lines, together with the arcs
+    making up their boundaries.
+
+    Each polygon ring is stored as a list of arc references, with ``~n``
+    referring to arc ``n`` traversed in reverse. Arcs are simplified and
+    projected once, and polygons rebuilt from the processed arcs, so that
+    neighbouring polygons always share identical edges.
+
+    :param lines: a noded network of lines, such as the result of
+                  :func:`shapely.ops.unary_union`
+    :type lines: :class:`shapely.geometry.MultiLineString`
+    """
+    def __init__(self, lines):
+        merged = shapely.ops.linemerge(lines)
+        if merged.geom_type == 'LineString':
+            merged = [merged]
+        self.__arcs = [np.array(line.coords)[:, :2] for line in merged]
+        self.__node_arcs = defaultdict(list)
+        for (n, arc) in enumerate(self.__arcs):
+            self.__node_arcs[tuple(arc[0])].append(n)
+            self.__node_arcs[tuple(arc[-1])].append(~n)
+        self.__polygons = list(shapely.ops.polygonize(lines))
+        self.__polygon_arcs = [self.__polygon_arcs(polygon) for polygon in self.__polygons]
+        self.__processed_arcs = {}
+
+    @property
+    def arcs(self):
+        return self.__arcs
+
+    @property
+    def polygons(self):
+        """
+        :returns: The polygons formed by the line network, in the order
+                  given by :func:`shapely.ops.polygonize`.
+        :rtype: list(:class:`shapely.geometry.Polygon`)
+        """
+        return self.__polygons
+
+    def reference(self, index):
+    #==========================
+        return PolygonReference(self, index)
+
+    def __polygon_arcs(self, polygon):
+    #=================================
+        rings = []
+        for ring in [polygon.exterior] + list(polygon.interiors):
+            ring_arcs = self.__ring_arcs(np.array(ring.coords)[:, :2])
+            if ring_arcs is None:
+                # Not made from arcs so keep the ring as an arc of its own
+                self.__arcs.append(np.array(ring.coords)[:, :2])
+                ring_arcs = [len(self.__arcs) - 1]
+            rings.append(ring_arcs)
+        return rings
+
+    def __ring_arcs(self, coords):
+    #=============================
+        # Start the ring at a node
+        start = None
+        for (n, coord) in enumerate(coords[:-1]):
+            if tuple(coord) in self.__node_arcs:
+                start = n
+                break
+        if start is None:
+            return None
+        coords = np.concatenate((coords[start:-1], coords[:start+1]))
+        ring_arcs = []
+        pos = 0
+        while pos < (len(coords) - 1):
+            for ref in self.__node_arcs.get(tuple(coords[pos]), []):
+                arc = self.__arcs[ref] if ref >= 0 else self.__arcs[~ref][::-1]
+                end = pos + len(arc)
+                if end <= len(coords) and np.array_equal(arc, coords[pos:end]):
+                    ring_arcs.append(ref)
+                    pos = end - 1
+                    break
+            else:
+                return None
+        return ring_arcs
+
+    def __arc_list(self, tolerance, projection):
+    #===========================================
+        key = (tolerance, projection)
+        arcs = self.__processed_arcs.get(key)
+        if arcs is None:
+            arcs = []
+            for arc in self.__arcs:
+                if tolerance > 0:
+                    arc = np.array(shapely.geometry.LineString(arc)
+                                       .simplify(tolerance, preserve_topology=True).coords)
+                if projection is not None:
+                    arc = projection(arc)
+                arcs.append(arc)
+            self.__processed_arcs[key] = arcs
+        return arcs
+
+    def __ring_coords(self, ring_arcs, arcs):
+    #========================================
+        coords = []
+        for ref in ring_arcs:
+            arc = arcs[ref] if ref >= 0 else arcs[~ref][::-1]
+            coords.append(arc if len(coords) == 0 else arc[1:])
+        return np.concatenate(coords)
+
+    def polygon(self, index, tolerance=0, projection=None):
+    #======================================================
+        """
+        Rebuild a polygon from its arcs.
+
+        :param index: the polygon's index in :attr:`polygons`
+        :type index: int
+        :param tolerance: if positive, arcs are first simplified using this tolerance
+        :type tolerance: float
+        :param projection: an optional function to project an ``(N, 2)`` coordinate array
+        :rtype: :class:`shapely.geometry.Polygon`
+        """
+        arcs = self.__arc_list(tolerance, projection)
+        rings = []
+        for ring_arcs in self.__polygon_arcs[index]:
+            coords = self.__ring_coords(ring_arcs, arcs)
+            if len(coords) < 4 and tolerance > 0:
+                # Simplification has collapsed the ring
+                coords = self.__ring_coords(ring_arcs, self.__arc_list(0, projection))
+            rings.append(coords)
+        return shapely.geometry.Polygon(rings[0], rings[1:])
+
+#===============================================================================
@@ -43,13 +43,14 @@ from mapmaker.utils import log
 #===============================================================================
 
 from .flatmap.feature import Feature
+from .flatmap.store import FeatureStore
 from .flatmap.layers import FeatureLayer
 
 from .geometry import bounds_to_extent, extent_to_bounds, normalised_coords
 
 from .knowledgebase import LabelDatabase
 
-from .output.geojson import GeoJSONOutput
+from .output.geojson import GeoJSONOutput, TILE_PROPERTIES
 from .output.mbtiles import MBTiles
 from .output.styling import MapStyle
 from .output.tilejson import tile_json
@@ -181,6 +182,10 @@ class Flatmap(object):
         self.__tippe_inputs = []
         self.__upload_files = []
 
+        # Details layers' outlines, coordinates and placements, keyed by layer id
+        # and kept only while a layer's details are being added
+        self.__hires_details = {}
+
         # Properties about map features
         self.__map_properties = JsonProperties(self.__manifest)
 
@@ -260,6 +265,7 @@ class Flatmap(object):
         self.__geojson_files = []
         self.__tippe_inputs = []
         self.__upload_files = []
+        self.__hires_details = {}
 
     def __finish_make(self):
     #=======================
@@ -333,6 +339,18 @@ class Flatmap(object):
         self.__last_feature_id += 1
         return Feature(self.__last_feature_id, geometry, properties, has_children)
 
+    def reserve_feature_ids(self, count):
+    #====================================
+        """
+        Reserve a block of feature ids, for features that have been made elsewhere.
+
+        :returns: The id preceding the block.
+        :rtype: int
+        """
+        last_feature_id = self.__last_feature_id
+        self.__last_feature_id += count
+        return last_feature_id
+
     def __add_layer(self, layer):
     #============================
         if layer.id in self.__layer_dict:
@@ -374,6 +392,8 @@ class Flatmap(object):
                 detail_layer = FeatureLayer('{}_details'.format(layer.id), layer.source, base_layer=True)
                 detail_layers.append(detail_layer)
                 self.__add_detail_features(layer, detail_layer, layer.detail_features)
+                # Release the high-resolution coordinates once they have been placed
+                self.__hires_details = {}
         for layer in detail_layers:
             self.__add_layer(layer)
 
@@ -393,9 +413,62 @@ class Flatmap(object):
         self.save_feature_id(new_feature)
         return new_feature
 
+    def __hires_layer_details(self, hires_layer, check_geometries):
+    #==============================================================
+        # A details layer's outline rectangle and coordinate store, which
+        # are the same wherever the layer is placed, along with the layer's
+        # placements. These are rebuilt if, when asked to check, the layer's
+        # features or their geometries have changed since they were cached
+        details = self.__hires_details.get(hires_layer.id)
+        if details is not None and check_geometries:
+            geometries = details[0]
+            if (len(geometries) != len(hires_layer.features)
+             or any(geometry is not self.__stored_geometry(feature)
+                    for (geometry, feature) in zip(geometries, hires_layer.features))):
+                details = None
+        if details is None:
+            boundary_feature = hires_layer.features_by_id.get(hires_layer.boundary_id)
+            if boundary_feature is None:
+                raise KeyError("Cannot find boundary of '{}' layer".format(hires_layer.id))
+            # NOTE: We reorder the coordinates of the bounding rectangles so that the first
+            #       coordinate is the top left-most one. This should ensure that the source
+            #       and destination rectangles align as intended, without output features
+            #       being rotated by some multiple of 90 degrees.
+            src = np.array(normalised_coords(boundary_feature.geometry.minimum_rotated_rectangle), dtype="float32")
+            details = ([self.__stored_geometry(feature) for feature in hires_layer.features],
+                       boundary_feature, src, FeatureStore(hires_layer.features), {})
+            self.__hires_details[hires_layer.id] = details
+        return details[1:]
+
+    def __stored_geometry(self, feature):
+    #====================================
+        group = feature.geometry_group
+        return group if group is not None else feature.geometry
+
+    def __detail_placement(self, hires_layer, feature, check_geometries):
+    #====================================================================
+        # The transform placing a details layer onto a feature, along with the
+        # placed outline and features, all computed once for each distinct
+        # layer and target rectangle
+        (boundary_feature, src, hires_store, placements) = self.__hires_layer_details(hires_layer,
+                                                                                     check_geometries)
+        dst = np.array(normalised_coords(feature.geometry.minimum_rotated_rectangle), dtype="float32")
+        key = dst.tobytes()
+        placement = placements.get(key)
+        if placement is None:
+            transform = Transform(cv2.getPerspectiveTransform(src, dst))
+            # All of the layer's coordinates are transformed together
+            geometries = list(hires_store.transform(transform.transform_points).geometries())
+            placement = (transform, transform.transform_geometry(boundary_feature.geometry), geometries)
+            placements[key] = placement
+        return placement
+
     def __add_detail_features(self, layer, detail_layer, lowres_features):
     #=====================================================================
         extra_details = []
+        # Hires layers don't change whilst their details are being placed, so
+        # their cached geometries only need checking once for each call
+        checked_layers = set()
         for feature in lowres_features:
             self.__map_properties.update_feature_properties(feature.properties)
             hires_layer_id = feature.get_property('details')
@@ -403,24 +476,16 @@ class Flatmap(object):
             if hires_layer is None:
                 print("Cannot find details' layer '{}'".format(feature.get_property('details')))
                 continue
-            boundary_feature = hires_layer.features_by_id.get(hires_layer.boundary_id)
-            if boundary_feature is None:
-                raise KeyError("Cannot find boundary of '{}' layer".format(hires_layer.id))
 
             # Calculate transformation to map source shapes to the destination
-
-            # NOTE: We reorder the coordinates of the bounding rectangles so that the first
-            #       coordinate is the top left-most one. This should ensure that the source
-            #       and destination rectangles align as intended, without output features
-            #       being rotated by some multiple of 90 degrees.
-            src = np.array(normalised_coords(boundary_feature.geometry.minimum_rotated_rectangle), dtype="float32")
-            dst = np.array(normalised_coords(feature.geometry.minimum_rotated_rectangle), dtype="float32")
-            transform = Transform(cv2.getPerspectiveTransform(src, dst))
+            (transform, boundary_geometry, detail_geometries) = self.__detail_placement(hires_layer, feature,
+                                                                                         hires_layer.id not in checked_layers)
+            checked_layers.add(hires_layer.id)
 
             minzoom = feature.get_property('maxzoom') + 1
             if feature.get_property('type') != 'nerve':
                 # Set the feature's geometry to that of the high-resolution outline
-                feature.geometry = transform.transform_geometry(boundary_feature.geometry)
+                feature.geometry = boundary_geometry
             else:                             # nerve
                 feature.del_property('maxzoom')
 
@@ -431,10 +496,9 @@ class Flatmap(object):
                                         local_world_to_base=transform)
 
             # The detail layer gets a scaled copy of each high-resolution feature
-            for hires_feature in hires_layer.features:
+            for (hires_feature, geometry) in zip(hires_layer.features, detail_geometries):
                 new_feature = self.__new_detail_feature(layer.id, detail_layer, minzoom,
-                                                        transform.transform_geometry(hires_feature.geometry),
-                                                        hires_feature.properties)
+                                                        geometry, hires_feature.properties)
                 if new_feature.has_property('details'):
                     extra_details.append(new_feature)
 
@@ -513,7 +577,8 @@ class Flatmap(object):
         for layer in self.__layer_dict.values():
             if layer.base_layer:
                 log('Layer:', layer.id)
-                geojson_output = GeoJSONOutput(layer, self.__map_area, self.__map_dir)
+                geojson_output = GeoJSONOutput(layer, self.__map_area, self.__map_dir,
+                                               self.__zoom[0], self.__zoom[1])
                 saved_layer = geojson_output.save(layer.features, settings.get('saveGeoJSON', False))
                 for (layer_name, filename) in saved_layer.items():
                     self.__geojson_files.append(filename)
@@ -542,10 +607,13 @@ class Flatmap(object):
             tile_db.add_metadata(describes=self.__models)
         # Save layer details in metadata
         tile_db.add_metadata(layers=json.dumps(self.__layer_metadata()))
-        # Save pathway details in metadata
-        tile_db.add_metadata(pathways=json.dumps(self.__map_properties.resolved_pathways))
-        # Save annotations in metadata
-        tile_db.add_metadata(annotations=json.dumps(self.__annotations))
+        # Save pathway details in their own tables
+        tile_db.add_pathways(self.__map_properties.resolved_pathways)
+        # Save feature annotations in their own table
+        tile_db.add_annotations(self.__annotations)
+        # List the properties kept in slimmed vector tiles
+        if settings.get('slimTiles', False):
+            tile_db.add_metadata(tile_properties=json.dumps(TILE_PROPERTIES))
         # Save command used to run mapmaker
         tile_db.add_metadata(created_by=self.__creator)
         # Save the maps creation time
@@ -0,0 +1,107 @@
+#===============================================================================
+#
+#  Flatmap viewer and annotation tools
+#
+#  Copyright (c) 2020  David Brooks
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+#===============================================================================
+
+from mapmaker import MAX_ZOOM, MIN_ZOOM
+from mapmaker.geometry import pixel_size
+
+#===============================================================================
+
+# Simplification tolerance as a fraction of a pixel
+PIXEL_TOLERANCE = 0.5
+
+#===============================================================================
+
+def vertex_count(geometry):
+#==========================
+    geom_type = geometry.geom_type
+    if geom_type in ['Point', 'LineString', 'LinearRing']:
+        return len(geometry.coords)
+    elif geom_type == 'Polygon':
+        return (len(geometry.exterior.coords)
+              + sum(len(ring.coords) for ring in geometry.interiors))
+    else:
+        return sum(vertex_count(geom) for geom in geometry)
+
+#===============================================================================
+
+class ZoomGeneraliser(object):
+    """
+    Simplify geometries to suit the zoom levels at which they are shown.
+
+    At each zoom level a geometry is simplified with a tolerance of a fraction
+    of a pixel, and features smaller than a pixel are not shown at that level.
+    Consecutive zoom levels with the same simplified geometry share it.
+
+    :param min_zoom: the map's minimum zoom level
+    :type min_zoom: int
+    :param max_zoom: the map's maximum zoom level
+    :type max_zoom: int
+    :param tolerance: simplification tolerance as a fraction of a pixel
+    :type tolerance: float
+    """
+    def __init__(self, min_zoom=MIN_ZOOM, max_zoom=MAX_ZOOM, tolerance=PIXEL_TOLERANCE):
+        self.__min_zoom = min_zoom
+        self.__max_zoom = max_zoom
+        self.__tolerance = tolerance
+
+    def generalise(self, geometry, min_zoom=None, max_zoom=None, simplify=None):
+    #===========================================================================
+        """
+        :param geometry: the geometry, in world coordinates, to generalise
+        :type geometry: :class:`shapely.geometry.base.BaseGeometry`
+        :param min_zoom: the feature's minimum zoom, defaults to the map's
+        :type min_zoom: int
+        :param max_zoom: the feature's maximum zoom, defaults to the map's
+        :type max_zoom: int
+        :param simplify: an optional function, given a tolerance, to use in place
+                         of :meth:`simplify` on ``geometry``
+        :returns: ``(min_zoom, max_zoom, geometry)`` tuples with the simplified
+                  geometry to use over each zoom range, highest zoom first.
+        :rtype: list
+        """
+        min_zoom = self.__min_zoom if min_zoom is None else max(min_zoom, self.__min_zoom)
+        max_zoom = self.__max_zoom if max_zoom is None else min(max_zoom, self.__max_zoom)
+        if geometry.geom_type in ['Point', 'MultiPoint'] or min_zoom > max_zoom:
+            return [(min_zoom, max_zoom, geometry)]
+        bounds = geometry.bounds
+        extent = max(bounds[2] - bounds[0], bounds[3] - bounds[1])
+        ranges = []
+        last_count = None
+        for zoom in range(max_zoom, min_zoom - 1, -1):
+            size = pixel_size(zoom)
+            if extent < size and len(ranges):
+                break
+            if simplify is None:
+                simplified = geometry.simplify(self.__tolerance*size, preserve_topology=True)
+            else:
+                simplified = simplify(self.__tolerance*size)
+            if simplified.is_empty:
+                break
+            count = vertex_count(simplified)
+            if count == last_count:
+                ranges[-1][0] = zoom
+            else:
+                ranges.append([zoom, zoom, simplified])
+                last_count = count
+        if len(ranges) == 0:
+            return [(min_zoom, max_zoom, geometry)]
+        return [tuple(r) for r in ranges]
+
+#===============================================================================
@@ -18,28 +18,56 @@
 #
 #===============================================================================
 
-import json
 import math
 import os
 
 #===============================================================================
 
-import shapely.geometry
+from mapmaker import MAX_ZOOM, MIN_ZOOM
+from mapmaker.flatmap.feature import GeometryGroup
+from mapmaker.flatmap.store import FeatureStore
+from mapmaker.geometry import mercator_project, mercator_transform
+from mapmaker.settings import settings
+from mapmaker.sources.markup import ignore_property
+from mapmaker.utils import ProgressBar
+
+from .generalise import ZoomGeneraliser
+from .serialiser import coordinate_precision, feature_as_json, geometry_as_json
 
 #===============================================================================
 
-from mapmaker.geometry import mercator_transform
-from mapmaker.sources.markup import ignore_property
-from mapmaker.utils import ProgressBar
+# Feature properties used by the viewer to style and filter vector tile features
+TILE_PROPERTIES = [
+    'featureId',
+    'geometry',
+    'group',
+    'interior',
+    'invisible',
+    'kind',
+    'label',
+    'layer',
+    'models',
+    'nerveId',
+    'scale',
+    'type',
+]
 
 #===============================================================================
 
 class GeoJSONOutput(object):
-    def __init__(self, layer, map_area, output_dir):
-    #================================================
+    def __init__(self, layer, map_area, output_dir, min_zoom=MIN_ZOOM, max_zoom=MAX_ZOOM):
+    #====================================================================================
         self.__layer = layer
         self.__map_area = map_area
         self.__output_dir = output_dir
+        self.__precision = settings.get('coordinatePrecision')
+        if self.__precision is None:
+            self.__precision = coordinate_precision(max_zoom)
+        if settings.get('generalise', False):
+            self.__generaliser = ZoomGeneraliser(min_zoom, max_zoom)
+        else:
+            self.__generaliser = None
+        self.__slim_tiles = settings.get('slimTiles', False)
         self.__geojson_layers = {
             'features': [],
             'pathways': []
@@ -54,16 +82,15 @@ class GeoJSONOutput(object):
             saved_filenames[geojson_id] = filename
             with open(filename, 'w') as output_file:
                 if pretty_print:
-                    feature_collection = {
-                        'type': 'FeatureCollection',
-                        'features': self.__geojson_layers.get(geojson_id, [])
-                    }
-                    output_file.write(json.dumps(feature_collection, indent=4))
+                    # A valid GeoJSON file, with a feature per line
+                    output_file.write('{"type":"FeatureCollection","features":[\n')
+                    output_file.write(',\n'.join(self.__geojson_layers.get(geojson_id, [])))
+                    output_file.write('\n]}\n')
                 else:
                     # Tippecanoe doesn't need a FeatureCollection
                     # Delimit features with RS...LF   (RS = 0x1E)
                     for feature in self.__geojson_layers.get(geojson_id, []):
-                        output_file.write('\x1E{}\x0A'.format(json.dumps(feature)))
+                        output_file.write('\x1E{}\x0A'.format(feature))
         return saved_filenames
 
     def __save_features(self, features):
@@ -72,18 +99,33 @@ class GeoJSONOutput(object):
             unit='ftr', ncols=40,
             bar_format='{l_bar}{bar}| {n_fmt}/{total_fmt}')
 
+        # Project the coordinates of all features not in a topology together
+        mercator_geometries = FeatureStore([feature for feature in features
+                                                if feature.topology is None]
+                                          ).transform(mercator_project).geometries()
+
         for feature in features:
             properties = feature.properties.copy()
-            geometry = feature.geometry
+            group = feature.geometry_group
+            if group is not None and self.__generaliser is None:
+                # Members are projected and serialised part by part, without
+                # first being combined into a single geometry
+                geometry = group
+            else:
+                geometry = feature.geometry
             area = geometry.area
-            mercator_geometry = mercator_transform(geometry)
+            topology = feature.topology
+            if topology is None:
+                mercator_geometry = next(mercator_geometries)
+                if geometry is not group and isinstance(mercator_geometry, GeometryGroup):
+                    mercator_geometry = mercator_geometry.materialise()
+            else:
+                # Shared edges are projected once for all of the topology's polygons
+                mercator_geometry = topology.geometry(projection=mercator_project)
             geojson = {
-                'type': 'Feature',
-                'id': feature.feature_id,
                 'tippecanoe' : {
                     'layer' : properties['tile-layer']
                 },
-                'geometry': shapely.geometry.mapping(mercator_geometry),
                 'properties': {
                     'bounds': list(mercator_geometry.bounds),
                     # The viewer requires `centroid`
@@ -110,13 +152,47 @@ class GeoJSONOutput(object):
                     geojson['properties'][key] = value
             properties['bounds'] = geojson['properties']['bounds']
             properties['centroid'] = geojson['properties']['centroid']
-            properties['geometry'] = geojson['geometry']['type']
+            properties['geometry'] = mercator_geometry.geom_type
             properties['layer'] = self.__layer.id
 
             # The layer's annotation had property details for each feature
             self.__layer.annotations[feature.feature_id] = properties
 
-            self.__geojson_layers[properties['tile-layer']].append(geojson)
+            if self.__slim_tiles:
+                # Keep all properties in the annotation and only those needed for styling in tiles
+                for (key, value) in geojson['properties'].items():
+                    properties.setdefault(key, value)
+                geojson['properties'] = { key: value for (key, value) in geojson['properties'].items()
+                                                        if key in TILE_PROPERTIES }
+
+            geojson_layer = self.__geojson_layers[properties['tile-layer']]
+            if self.__generaliser is None:
+                geojson_layer.append(
+                    feature_as_json(feature.feature_id, geojson['tippecanoe'],
+                                    geometry_as_json(mercator_geometry, self.__precision),
+                                    geojson['properties']))
+            else:
+                if topology is None:
+                    simplify = None
+                else:
+                    # Simplify shared edges once so that neighbouring regions stay gap free
+                    simplify = lambda tolerance: topology.geometry(tolerance, mercator_project)
+                # Output a feature for each range of zoom levels that share a simplified geometry
+                for (min_zoom, max_zoom, simplified) in self.__generaliser.generalise(geometry,
+                                                            geojson['tippecanoe'].get('minzoom'),
+                                                            geojson['tippecanoe'].get('maxzoom'),
+                                                            simplify):
+                    tippecanoe = geojson['tippecanoe'].copy()
+                    tippecanoe['minzoom'] = min_zoom
+                    tippecanoe['maxzoom'] = max_zoom
+                    if simplified is geometry:
+                        simplified = mercator_geometry
+                    elif topology is None:
+                        simplified = mercator_transform(simplified)
+                    geojson_layer.append(
+                        feature_as_json(feature.feature_id, tippecanoe,
+                                        geometry_as_json(simplified, self.__precision),
+                                        geojson['properties']))
             progress_bar.update(1)
 
         progress_bar.close()
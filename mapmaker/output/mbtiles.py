@@ -18,9 +18,12 @@
 #
 #===============================================================================
 
+from collections import defaultdict
 import io
+import json
 import os
 import sqlite3
+import zlib
 
 #===============================================================================
 
@@ -36,6 +39,16 @@ class ExtractionError(Exception):
 
 #===============================================================================
 
+def compress_json(value):
+#========================
+    return sqlite3.Binary(zlib.compress(json.dumps(value).encode('utf-8')))
+
+def decompress_json(data):
+#=========================
+    return json.loads(zlib.decompress(data).decode('utf-8'))
+
+#===============================================================================
+
 class MBTiles(object):
     def __init__(self, filepath, create=False, force=False, silent=False):
         self._silent = silent
@@ -62,6 +75,63 @@ class MBTiles(object):
             self._cursor.execute('replace into metadata(name, value) values (?, ?);',
                                                                             (name, value))
 
+    def add_annotations(self, annotations):
+        self._cursor.execute('drop table if exists annotations;')
+        self._cursor.execute('create table annotations (id integer primary key, layer text, properties blob);')
+        self._cursor.execute('create index annotations_layer on annotations (layer);')
+        self._cursor.executemany('insert into annotations (id, layer, properties) values (?, ?, ?);',
+            [(int(id), properties.get('layer'), compress_json(properties))
+                for (id, properties) in annotations.items()])
+        layers = defaultdict(int)
+        for properties in annotations.values():
+            layers[properties.get('layer')] += 1
+        self.add_metadata(annotations=json.dumps({
+            'table': 'annotations',
+            'compression': 'zlib',
+            'features': len(annotations),
+            'layers': layers
+        }))
+
+    def annotation(self, id):
+        row = self._cursor.execute('select properties from annotations where id=?;', (id, )).fetchone()
+        return decompress_json(row[0]) if row is not None else None
+
+    def add_pathways(self, pathways):
+        for table in ['path_lines', 'path_nerves', 'path_nodes', 'path_types']:
+            self._cursor.execute('drop table if exists {};'.format(table))
+        self._cursor.execute('create table path_lines (path_id text, feature_id integer);')
+        self._cursor.execute('create table path_nerves (path_id text, feature_id integer);')
+        self._cursor.execute('create table path_nodes (path_id text, node_id integer, position text);')
+        self._cursor.execute('create table path_types (path_id text, type text);')
+        for table in ['path_lines', 'path_nerves']:
+            self._cursor.executemany('insert into {} (path_id, feature_id) values (?, ?);'.format(table),
+                [(path_id, feature_id) for (path_id, feature_ids) in pathways[table.replace('_', '-')].items()
+                    for feature_id in feature_ids])
+            self._cursor.execute('create index {0}_path on {0} (path_id);'.format(table))
+            self._cursor.execute('create index {0}_feature on {0} (feature_id);'.format(table))
+        for (position, node_paths) in pathways['node-paths'].items():
+            self._cursor.executemany('insert into path_nodes (path_id, node_id, position) values (?, ?, ?);',
+                [(path_id, node_id, position.split('-')[0]) for (node_id, path_ids) in node_paths.items()
+                    for path_id in path_ids])
+        self._cursor.execute('create index path_nodes_path on path_nodes (path_id);')
+        self._cursor.execute('create index path_nodes_node on path_nodes (node_id);')
+        self._cursor.executemany('insert into path_types (path_id, type) values (?, ?);',
+            [(path_id, path_type) for (path_type, path_ids) in pathways['type-paths'].items()
+                for path_id in path_ids])
+        self._cursor.execute('create index path_types_path on path_types (path_id);')
+        self.add_metadata(pathways=json.dumps({
+            'tables': ['path_lines', 'path_nerves', 'path_nodes', 'path_types'],
+            'paths': len(set(pathways['path-lines']) | set(pathways['path-nerves'])),
+            'types': [path_type for path_type in pathways['type-paths'] if path_type is not None]
+        }))
+
+    def feature_paths(self, feature_id):
+        rows = self._cursor.execute('''select path_id from path_lines where feature_id=?
+                                       union select path_id from path_nerves where feature_id=?
+                                       union select path_id from path_nodes where node_id=?;''',
+                                                                            (feature_id, feature_id, feature_id))
+        return [row[0] for row in rows.fetchall()]
+
     def update_metadata(self, **metadata):
         for name, value in metadata.items():
             self._cursor.execute('update metadata set value=? where name=?;',
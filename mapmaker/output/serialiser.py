@@ -0,0 +1,138 @@
+#===============================================================================
+#
+#  Flatmap viewer and annotation tools
+#
+#  Copyright (c) 2020  David Brooks
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+#===============================================================================
+
+"""
+Write features as GeoJSON text, without building intermediate ``dict``
+representations of their geometry.
+"""
+
+#===============================================================================
+
+import json
+import math
+
+#===============================================================================
+
+import numpy as np
+
+# Use a fast JSON encoder if one is available
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+#===============================================================================
+
+# Number of tippecanoe tile units across a vector tile (``--full-detail=12``)
+TILE_EXTENT = 4096
+
+#===============================================================================
+
+def coordinate_precision(max_zoom):
+#==================================
+    """
+    The number of decimal places needed to resolve a single tile unit,
+    with one extra digit to spare, at the given zoom level.
+
+    :param max_zoom: the map's maximum zoom level
+    :type max_zoom: int
+    :rtype: int
+    """
+    return math.ceil(math.log10(TILE_EXTENT*2**max_zoom/360.0)) + 1
+
+#===============================================================================
+
+def json_dumps(value):
+#=====================
+    if orjson is not None:
+        try:
+            return orjson.dumps(value, option=orjson.OPT_SERIALIZE_NUMPY).decode('utf-8')
+        except TypeError:
+            pass
+    return json.dumps(value, separators=(',', ':'))
+
+#===============================================================================
+
+def coordinate_list(coords, precision):
+#======================================
+    if len(coords) == 0:
+        return []
+    return np.round(np.asarray(coords, dtype=float)[:, :2], precision).tolist()
+
+def point_coordinates(point, precision):
+#=======================================
+    coordinates = coordinate_list(point.coords, precision)
+    return coordinates[0] if coordinates else []
+
+def polygon_coordinates(polygon, precision):
+#===========================================
+    if polygon.is_empty:
+        # As ``shapely.geometry.mapping`` gives for ``POLYGON EMPTY``
+        return []
+    return ([coordinate_list(polygon.exterior.coords, precision)]
+          + [coordinate_list(ring.coords, precision) for ring in polygon.interiors])
+
+def geometry_coordinates(geometry, precision):
+#=============================================
+    geom_type = geometry.geom_type
+    if geom_type == 'Point':
+        return point_coordinates(geometry, precision)
+    elif geom_type == 'LineString':
+        return coordinate_list(geometry.coords, precision)
+    elif geom_type == 'Polygon':
+        return polygon_coordinates(geometry, precision)
+    elif geom_type == 'MultiPoint':
+        return [point_coordinates(point, precision) for point in geometry]
+    elif geom_type == 'MultiLineString':
+        return [coordinate_list(line.coords, precision) for line in geometry]
+    elif geom_type == 'MultiPolygon':
+        return [polygon_coordinates(polygon, precision) for polygon in geometry]
+    raise TypeError('Unsupported geometry type: {}'.format(geom_type))
+
+def geometry_as_json(geometry, precision):
+#=========================================
+    """
+    Serialise a ``shapely`` geometry as GeoJSON text, rounding coordinates.
+
+    :param geometry: the geometry to serialise
+    :type geometry: :class:`shapely.geometry.base.BaseGeometry`
+    :param precision: the number of decimal places to keep in coordinates
+    :type precision: int
+    :rtype: str
+    """
+    if geometry.geom_type == 'GeometryCollection':
+        return '{{"type":"GeometryCollection","geometries":[{}]}}'.format(
+            ','.join([geometry_as_json(geom, precision) for geom in geometry]))
+    return '{{"type":"{}","coordinates":{}}}'.format(geometry.geom_type,
+        json_dumps(geometry_coordinates(geometry, precision)))
+
+#===============================================================================
+
+def feature_as_json(feature_id, tippecanoe, geometry_json, properties):
+#======================================================================
+    """
+    Serialise a GeoJSON ``Feature`` given its already serialised geometry.
+
+    :rtype: str
+    """
+    return '{{"type":"Feature","id":{},"tippecanoe":{},"geometry":{},"properties":{}}}'.format(
+        feature_id, json_dumps(tippecanoe), geometry_json, json_dumps(properties))
+
+#===============================================================================
@@ -23,7 +23,9 @@ import numpy as np
 
 #===============================================================================
 
+from mapmaker.flatmap.feature import Feature
 from mapmaker.geometry import bounds_to_extent
+from mapmaker.settings import settings
 
 #===============================================================================
 
@@ -170,6 +172,61 @@ class RasterSource(object):
 
 #===============================================================================
 
+class WorkerFlatmap(object):
+    """
+    Stands in for the flatmap when part of a source is processed in a worker
+    process, numbering features from 1 in the order they are made.
+    """
+    def __init__(self):
+        self.__features = []
+
+    @property
+    def features(self):
+        return self.__features
+
+    def new_feature(self, geometry, properties, has_children=False):
+    #===============================================================
+        feature = Feature(len(self.__features) + 1, geometry, properties, has_children)
+        self.__features.append(feature)
+        return feature
+
+#===============================================================================
+
+class WorkerSource(object):
+    """
+    Stands in for a :class:`MapSource` when part of it is processed in a
+    worker process.
+    """
+    def __init__(self, transform):
+        self.__flatmap = WorkerFlatmap()
+        self.__transform = transform
+        self.__errors = []
+
+    @property
+    def errors(self):
+        return self.__errors
+
+    @property
+    def flatmap(self):
+        return self.__flatmap
+
+    @property
+    def transform(self):
+        return self.__transform
+
+    def error(self, msg):
+    #====================
+        self.__errors.append(msg)
+
+#===============================================================================
+
+def initialise_worker(worker_settings):
+#======================================
+    # Worker processes that are spawned rather than forked need our settings
+    settings.update(worker_settings)
+
+#===============================================================================
+
 # Export our sources here to avoid circular imports
 
 from .mbfbioscience import MBFSource
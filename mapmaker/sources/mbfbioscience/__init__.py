@@ -132,11 +132,9 @@ class MBFSource(MapSource):
             label = contour.get('name')
             association = contour.xpath('ns:property[@name="TraceAssociation"]/ns:s', namespaces={'ns': self.__ns})
             anatomical_id = association[0].text if len(association) else None
-            points = []
-            for point in contour.findall(self.ns_tag('point')):
-                x = float(point.get('x'))
-                y = float(point.get('y'))
-                points.append(self.__um_to_world.transform_point((x, y)))
+            points = list(self.__um_to_world.transform_points(
+                            [(float(point.get('x')), float(point.get('y')))
+                                for point in contour.findall(self.ns_tag('point'))]))
 
             if contour.get('closed'):
                 if (points[0] != points[-1]).all():
@@ -18,6 +18,8 @@
 #
 #===============================================================================
 
+from concurrent.futures import ProcessPoolExecutor
+import io
 import os
 
 #===============================================================================
@@ -29,11 +31,12 @@ from pptx import Presentation
 #===============================================================================
 
 from .. import MapSource, RasterSource
+from .. import initialise_worker, WorkerSource
 from .. import WORLD_METRES_PER_EMU
 
 from mapmaker.geometry import Transform
 from mapmaker.settings import settings
-from mapmaker.utils import log, path_BytesIO, path_data
+from mapmaker.utils import log, path_data
 
 from .slide import PowerpointSlide
 
@@ -42,7 +45,8 @@ from .slide import PowerpointSlide
 class PowerpointSource(MapSource):
     def __init__(self, flatmap, id, source_path, get_background=False):
         super().__init__(flatmap, id)
-        self.__pptx = Presentation(path_BytesIO(source_path))
+        self.__pptx_bytes = path_data(source_path)
+        self.__pptx = Presentation(io.BytesIO(self.__pptx_bytes))
         self.__slides = self.__pptx.slides
 
         (width, height) = (self.__pptx.slide_width, self.__pptx.slide_height)
@@ -73,6 +77,20 @@ class PowerpointSource(MapSource):
 
     def process(self):
     #=================
+        jobs = settings.get('jobs', 1)
+        if jobs > 1 and len(self.__slides) > 1:
+            # Slides are processed by a pool of worker processes, each with its
+            # own copy of the presentation, and their results added in slide order
+            with ProcessPoolExecutor(max_workers=jobs, initializer=initialise_slide_worker,
+                                     initargs=(settings.copy(), self.__pptx_bytes)) as executor:
+                results = [executor.submit(process_worker_slide, n + 1, self.__transform)
+                            for n in range(len(self.__slides))]
+                self.__process_slides(results)
+        else:
+            self.__process_slides()
+
+    def __process_slides(self, results=None):
+    #========================================
         for n in range(len(self.__slides)):
             slide = self.__slides[n]
             slide_number = n + 1
@@ -83,7 +101,10 @@ class PowerpointSource(MapSource):
                                         '{}.xml'.format(slide_layer.id)), 'w')
                 xml.write(slide.element.xml)
                 xml.close()
-            slide_layer.process()
+            if results is None:
+                slide_layer.process()
+            else:
+                slide_layer.merge_worker_slide(results[n].result())
             for error in self.errors:
                 print(error)
             else:
@@ -91,5 +112,23 @@ class PowerpointSource(MapSource):
 
 #===============================================================================
 
+__worker_presentation = None
 
+def initialise_slide_worker(worker_settings, pptx_bytes):
+#========================================================
+    global __worker_presentation
+    initialise_worker(worker_settings)
+    __worker_presentation = Presentation(io.BytesIO(pptx_bytes))
 
+def process_worker_slide(slide_number, transform):
+#=================================================
+    """
+    Process a slide of the presentation in a worker process.
+
+    See :meth:`PowerpointSlide.process_worker_slide`.
+    """
+    slide = __worker_presentation.slides[slide_number - 1]
+    slide_layer = PowerpointSlide(WorkerSource(transform), slide, slide_number)
+    return slide_layer.process_worker_slide()
+
+#===============================================================================
@@ -22,9 +22,9 @@
 
 #===============================================================================
 
+from functools import lru_cache
 import math
 
-import pptx.shapes.connector
 from pptx.enum.shapes import MSO_SHAPE_TYPE
 
 #===============================================================================
@@ -128,18 +128,30 @@ class Evaluator(object):
     }
 
     @staticmethod
-    def evaluate(expr, context):
+    @lru_cache(maxsize=4096)
+    def compile(expr):
+        # Formulae are parsed once and then shared by all shapes
         args = expr.split()
-        return Evaluator.formulae[args[0]](context.evaluate, *args[1:])
+        return (Evaluator.formulae[args[0]], tuple(args[1:]))
+
+    @staticmethod
+    def evaluate(expr, context):
+        (formula, args) = Evaluator.compile(expr)
+        return formula(context.evaluate, *args)
 
 #===============================================================================
 
 class Geometry(object):
+    # Values of guides, shared by preset shapes with the same size and adjustments
+    value_tables_ = {}
+
     def __init__(self, shape):
         self._xfrm = shape.element.xfrm
+        preset = None
 
         if shape.shape_type == MSO_SHAPE_TYPE.AUTO_SHAPE:
-            self._geometry = Shapes.lookup(shape.element.prstGeom.attrib['prst'])
+            preset = shape.element.prstGeom.attrib['prst']
+            self._geometry = Shapes.lookup(preset)
             adjustments = shape.element.prstGeom.avLst
 
         elif shape.shape_type == MSO_SHAPE_TYPE.FREEFORM:
@@ -147,13 +159,22 @@ class Geometry(object):
             adjustments = None
 
         elif (shape.shape_type == MSO_SHAPE_TYPE.PICTURE
-           or isinstance(shape, pptx.shapes.connector.Connector)):
-            self._geometry = Shapes.lookup(shape.element.spPr.prstGeom.attrib['prst'])
+           or shape.shape_type == MSO_SHAPE_TYPE.LINE):
+            preset = shape.element.spPr.prstGeom.attrib['prst']
+            self._geometry = Shapes.lookup(preset)
             adjustments = None
 
         else:
             print('Unknown geometry for', shape.shape_type)
 
+        # Each guide is evaluated at most once for a shape
+        if preset is None:
+            self._values = {}
+        else:
+            key = (preset, shape.width, shape.height,
+                   tuple((gd.name, gd.fmla) for gd in adjustments) if adjustments is not None else ())
+            self._values = Geometry.value_tables_.setdefault(key, {})
+
         self._variables = {
             'w': shape.width,
             'h': shape.height
@@ -180,6 +201,13 @@ class Geometry(object):
         return self._xfrm
 
     def evaluate(self, x):
+        value = self._values.get(x)
+        if value is None:
+            value = self.__evaluate(x)
+            self._values[x] = value
+        return value
+
+    def __evaluate(self, x):
         try: return float(x)
         except ValueError: pass
         try: return self.evaluate(PRESET_VARIABLES[x])
@@ -19,6 +19,7 @@
 #===============================================================================
 
 import os.path
+import re
 
 import pptx.oxml as oxml
 import pptx.oxml.ns as ns
@@ -29,7 +30,6 @@ from pptx.oxml.simpletypes import XsdString
 from pptx.oxml.xmlchemy import (
     BaseOxmlElement,
     RequiredAttribute,
-    ZeroOrMore,
     ZeroOrOne
 )
 
@@ -45,18 +45,6 @@ ns._nsmap['drawml'] = ("http://www.ecma-international.org/flat/publications/stan
 
 #===============================================================================
 
-class PresetShapeDefinition(BaseOxmlElement):
-    """`drawml:presetShapeDefinition` element class."""
-
-    presetShapeLst = ZeroOrMore("drawml:presetShape")
-
-    @classmethod
-    def new(cls, xml):
-        """Return shape definitions configured as ..."""
-        return oxml.parse_xml(xml)
-
-#===============================================================================
-
 class Geometry2D(BaseOxmlElement):
     avLst = ZeroOrOne("a:avLst")
     gdLst = ZeroOrOne("a:gdLst")
@@ -74,20 +62,38 @@ class PresetShape(Geometry2D):
 oxml.register_element_cls("a:custGeom", Geometry2D)
 oxml.register_element_cls("a:gdLst", CT_GeomGuideList)
 
-oxml.register_element_cls("drawml:presetShapeDefinition", PresetShapeDefinition)
 oxml.register_element_cls("drawml:presetShape", PresetShape)
 
 #===============================================================================
 
+PRESET_DEFINITIONS = os.path.join(os.path.dirname(__file__), 'presetShapeDefinitions.xml')
+
+PRESET_SHAPE = re.compile(rb'<drawml:presetShape name="([^"]+)">.*?</drawml:presetShape>', re.DOTALL)
+
+#===============================================================================
+
 class Shapes(object):
     definitions_ = {}
-
-    with open(os.path.join(os.path.dirname(__file__), 'presetShapeDefinitions.xml'), 'rb') as defs:
-        for defn in PresetShapeDefinition.new(defs.read()):
-            definitions_[defn.name] = defn
+    sources_ = None
 
     @staticmethod
     def lookup(name):
-        return Shapes.definitions_[name]
+        # Definitions are only parsed when a shape first needs them
+        definition = Shapes.definitions_.get(name)
+        if definition is None:
+            if Shapes.sources_ is None:
+                Shapes.sources_ = Shapes.__load_sources()
+            definition = oxml.parse_xml(Shapes.sources_[name])
+            Shapes.definitions_[name] = definition
+        return definition
+
+    @staticmethod
+    def __load_sources():
+        # Find the XML of each definition, declaring its namespace
+        # prefix so it can be parsed by itself
+        namespace = 'xmlns:drawml="{}" '.format(ns._nsmap['drawml']).encode()
+        with open(PRESET_DEFINITIONS, 'rb') as defs:
+            return { match.group(1).decode(): match.group(0).replace(b'name=', namespace + b'name=', 1)
+                        for match in PRESET_SHAPE.finditer(defs.read()) }
 
 #===============================================================================
@@ -0,0 +1,136 @@
+#===============================================================================
+#
+#  Flatmap viewer and annotation tools
+#
+#  Copyright (c) 2019  David Brooks
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+#===============================================================================
+
+"""
+Read the shapes of a slide directly from its ``p:spTree`` element.
+
+`python-pptx` wraps each shape in a proxy object and finds a shape's name,
+type and size with XPath queries. This is slow for slides with many shapes,
+so the little we need is read straight from the XML instead.
+"""
+
+#===============================================================================
+
+from pptx.enum.shapes import MSO_SHAPE_TYPE
+from pptx.oxml.ns import qn
+from pptx.shapes.shapetree import BaseShapeFactory, SlideShapeFactory
+
+#===============================================================================
+
+SHAPE_TAGS = [qn('p:sp'), qn('p:grpSp'), qn('p:graphicFrame'),
+              qn('p:cxnSp'), qn('p:pic'), qn('p:contentPart')]
+
+C_NV_PR = qn('p:cNvPr')
+C_NV_SP_PR = qn('p:cNvSpPr')
+CUST_GEOM = qn('a:custGeom')
+PLACEHOLDER = '{}/{}'.format(qn('p:nvPr'), qn('p:ph'))
+PRST_GEOM = qn('a:prstGeom')
+SP_PR = qn('p:spPr')
+VIDEO_FILE = '{}/{}'.format(qn('p:nvPr'), qn('a:videoFile'))
+
+#===============================================================================
+
+def shape_type(element, top_level=False):
+#=======================================
+    """
+    The type `python-pptx` gives a shape.
+
+    :param element: the shape's XML element
+    :param top_level: the shape is on a slide and not in a group
+    :rtype: :class:`MSO_SHAPE_TYPE`
+    """
+    tag = element.tag
+    if tag == qn('p:grpSp'):
+        return MSO_SHAPE_TYPE.GROUP
+    elif tag == qn('p:cxnSp'):
+        return MSO_SHAPE_TYPE.LINE
+    non_visual = element[0]
+    if non_visual.find(PLACEHOLDER) is None:
+        if tag == qn('p:sp'):
+            properties = element.find(SP_PR)
+            if properties.find(CUST_GEOM) is not None:
+                return MSO_SHAPE_TYPE.FREEFORM
+            text_box = non_visual.find(C_NV_SP_PR).get('txBox') in ['1', 'true']
+            if properties.find(PRST_GEOM) is not None and not text_box:
+                return MSO_SHAPE_TYPE.AUTO_SHAPE
+            elif text_box:
+                return MSO_SHAPE_TYPE.TEXT_BOX
+        elif tag == qn('p:pic') and non_visual.find(VIDEO_FILE) is None:
+            return MSO_SHAPE_TYPE.PICTURE
+    # Placeholders and less common shapes are left to `python-pptx`
+    factory = SlideShapeFactory if top_level else BaseShapeFactory
+    return factory(element, None).shape_type
+
+def shape_list(element, top_level=False):
+#========================================
+    """
+    :param element: a slide's ``p:spTree`` or a group's ``p:grpSp`` element
+    :param top_level: the element is a slide's ``p:spTree``
+    :rtype: list(:class:`SlideShape`)
+    """
+    return [SlideShape(child, top_level) for child in element if child.tag in SHAPE_TAGS]
+
+#===============================================================================
+
+class SlideShape(object):
+    """
+    A shape on a slide, with the same ``name``, ``shape_type``, ``width``
+    and ``height`` as its `python-pptx` shape object.
+
+    :param element: the shape's XML element
+    :param top_level: the shape is on a slide and not in a group
+    """
+    def __init__(self, element, top_level=False):
+        self.__element = element
+        self.__top_level = top_level
+        self.__name = element[0].find(C_NV_PR).get('name')
+        self.__shape_type = None
+        self.__shapes = None
+
+    @property
+    def element(self):
+        return self.__element
+
+    @property
+    def height(self):
+        return self.__element.cy
+
+    @property
+    def name(self):
+        return self.__name
+
+    @property
+    def shape_type(self):
+        if self.__shape_type is None:
+            self.__shape_type = shape_type(self.__element, self.__top_level)
+        return self.__shape_type
+
+    @property
+    def shapes(self):
+        # The shapes in a group
+        if self.__shapes is None:
+            self.__shapes = shape_list(self.__element)
+        return self.__shapes
+
+    @property
+    def width(self):
+        return self.__element.cx
+
+#===============================================================================
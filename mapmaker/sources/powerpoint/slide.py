@@ -33,15 +33,15 @@ from beziers.quadraticbezier import QuadraticBezier
 import numpy as np
 import shapely.geometry
 
-import pptx.shapes.connector
 from pptx.enum.shapes import MSO_SHAPE_TYPE
 
 #===============================================================================
 
 from mapmaker.flatmap.layers import FeatureLayer
 from mapmaker.geometry import ellipse_point
-from mapmaker.geometry import bezier_sample
-from mapmaker.geometry.arc_to_bezier import bezier_paths_from_arc_endpoints, tuple2
+from mapmaker.geometry.arc_to_bezier import bezier_control_points_from_arc_endpoints
+from mapmaker.geometry.arc_to_bezier import bezier_path_from_control_points, tuple2
+from mapmaker.geometry.curves import PathBuilder
 from mapmaker.settings import settings
 from mapmaker.utils import ProgressBar
 
@@ -49,6 +49,7 @@ from ..markup import parse_layer_directive, parse_markup
 
 from .formula import Geometry, radians
 from .presets import DML
+from .shapes import shape_list
 from .transform import DrawMLTransform
 
 #===============================================================================
@@ -72,6 +73,8 @@ class PowerpointSlide(FeatureLayer):
         self.__slide_number = slide_number
         self.__transform = source.transform
         self.__current_group = []
+        # Changes to the flatmap and source, recorded when in a worker process
+        self.__changes = None
 
     @property
     def slide(self):
@@ -85,12 +88,72 @@ class PowerpointSlide(FeatureLayer):
     def slide_number(self):
         return self.__slide_number
 
-    def process(self):
-    #=================
+    def process(self, show_progress=True):
+    #=====================================
         self.__current_group.append('SLIDE')
-        features = self.__process_shape_list(self.slide.shapes, self.__transform, show_progress=True)
+        features = self.__process_shape_list(shape_list(self.slide.element.cSld.spTree, top_level=True),
+                                             self.__transform, show_progress=show_progress)
         self.add_features('Slide', features, outermost=True)
 
+    def process_worker_slide(self):
+    #==============================
+        """
+        Process the slide in a worker process.
+
+        :returns: All features made, in id order, the features added to the layer,
+                  the layer's boundary feature id, and changes to be made to the
+                  flatmap and source, in order.
+        :rtype: tuple
+        """
+        self.__changes = []
+        self.process(show_progress=False)
+        return (self.flatmap.features, self.features, self.boundary_id, self.__changes)
+
+    def merge_worker_slide(self, result):
+    #====================================
+        """
+        Add the results of processing the slide in a worker process, renumbering
+        its features to follow those already in the flatmap.
+
+        :param result: the value returned by :meth:`process_worker_slide`
+        """
+        (new_features, layer_features, boundary_id, changes) = result
+        last_feature_id = self.flatmap.reserve_feature_ids(len(new_features))
+        for feature in new_features:
+            feature.feature_id += last_feature_id
+        for change in changes:
+            if change[0] == 'check':
+                self.__check_feature_id(*change[1:])
+            elif change[0] == 'error':
+                self.source.error(change[1])
+            elif change[0] == 'save':
+                self.flatmap.save_feature_id(change[1])
+        for feature in layer_features:
+            self.add_feature(feature)
+        if boundary_id is not None:
+            self.boundary_id = boundary_id + last_feature_id
+
+    def __check_feature_id(self, id, message):
+    #=========================================
+        if self.__changes is not None:
+            self.__changes.append(('check', id, message))
+        elif self.flatmap.is_duplicate_feature_id(id):
+            self.source.error(message)
+
+    def __error(self, message):
+    #==========================
+        if self.__changes is not None:
+            self.__changes.append(('error', message))
+        else:
+            self.source.error(message)
+
+    def __save_feature_id(self, feature):
+    #====================================
+        if self.__changes is not None:
+            self.__changes.append(('save', feature))
+        else:
+            self.flatmap.save_feature_id(feature)
+
     def __process_group(self, group, properties, transform):
     #=======================================================
         features = self.__process_shape_list(group.shapes, transform@DrawMLTransform(group))
@@ -109,28 +172,28 @@ class PowerpointSlide(FeatureLayer):
                 group_name = self.__current_group[-1]  # For error reporting
                 properties.update(parse_markup(shape.name))
                 if 'error' in properties:
-                    self.source.error('Shape in slide {}, group {}, has annotation syntax error: {}'
-                                        .format(self.__slide_number, group_name, shape.name))
+                    self.__error('Shape in slide {}, group {}, has annotation syntax error: {}'
+                                   .format(self.__slide_number, group_name, shape.name))
                 if 'warning' in properties:
-                    self.source.error('Warning, slide {}, group {}: {}'
-                                        .format(self.__slide_number, group_name, properties['warning']))
+                    self.__error('Warning, slide {}, group {}: {}'
+                                   .format(self.__slide_number, group_name, properties['warning']))
                 for key in ['id', 'path']:
                     if key in properties:
-                        if self.flatmap.is_duplicate_feature_id(properties[key]):
-                           self.source.error('Shape in slide {}, group {}, has a duplicate id: {}'
-                                               .format(self.__slide_number, group_name, shape.name))
+                        self.__check_feature_id(properties[key],
+                            'Shape in slide {}, group {}, has a duplicate id: {}'
+                                .format(self.__slide_number, group_name, shape.name))
             if 'error' in properties:
                 pass
             elif 'path' in properties:
                 pass
             elif (shape.shape_type == MSO_SHAPE_TYPE.AUTO_SHAPE
              or shape.shape_type == MSO_SHAPE_TYPE.FREEFORM
-             or isinstance(shape, pptx.shapes.connector.Connector)):
+             or shape.shape_type == MSO_SHAPE_TYPE.LINE):
                 geometry = self.__get_geometry(shape, properties, transform)
                 feature = self.flatmap.new_feature(geometry, properties)
                 if self.base_layer and not feature.get_property('group'):
                     # Save relationship between id/class and internal feature id
-                    self.flatmap.save_feature_id(feature)
+                    self.__save_feature_id(feature)
                 features.append(feature)
             elif shape.shape_type == MSO_SHAPE_TYPE.GROUP:
                 self.__current_group.append(properties.get('markup', "''"))
@@ -138,7 +201,7 @@ class PowerpointSlide(FeatureLayer):
                 self.__current_group.pop()
                 if grouped_feature is not None:
                     if self.base_layer:
-                        self.flatmap.save_feature_id(grouped_feature)
+                        self.__save_feature_id(grouped_feature)
                     features.append(grouped_feature)
             elif (shape.shape_type == MSO_SHAPE_TYPE.TEXT_BOX
                or shape.shape_type == MSO_SHAPE_TYPE.PICTURE):
@@ -154,12 +217,19 @@ class PowerpointSlide(FeatureLayer):
     ##
     ## Returns shape's geometry as `shapely` object.
     ##
-        coordinates = []
+        path_builder = PathBuilder()
         bezier_segments = []
+        save_beziers = settings.get('saveBeziers', False)
         pptx_geometry = Geometry(shape)
+        shape_transforms = {}
         for path in pptx_geometry.path_list:
             bbox = (shape.width, shape.height) if path.w is None or path.h is None else (path.w, path.h)
-            T = transform@DrawMLTransform(shape, bbox)
+            T = shape_transforms.get(bbox)
+            if T is None:
+                T = transform@DrawMLTransform(shape, bbox)
+                shape_transforms[bbox] = T
+            # The path's points are transformed together by the builder
+            path_builder.transform = T
 
             moved = False
             first_point = None
@@ -177,37 +247,38 @@ class PowerpointSlide(FeatureLayer):
                     pt = (current_point[0] - p1[0] + p2[0],
                           current_point[1] - p1[1] + p2[1])
                     large_arc_flag = 1 if swAng >= math.pi else 0
-                    paths = bezier_paths_from_arc_endpoints(tuple2(wR, hR),
+                    control_points = bezier_control_points_from_arc_endpoints(tuple2(wR, hR),
                                         0, large_arc_flag, 1,
-                                        tuple2(*current_point), tuple2(*pt),
-                                        T)
-                    bezier_segments.extend(paths.asSegments())
-                    coordinates.extend(bezier_sample(paths))
+                                        tuple2(*current_point), tuple2(*pt))
+                    if save_beziers:
+                        bezier_segments.extend(bezier_path_from_control_points(
+                            T.transform_points(control_points).reshape(-1, 4, 2)).asSegments())
+                    path_builder.add_beziers(control_points)
                     current_point = pt
 
                 elif c.tag == DML('close'):
                     if first_point is not None and current_point != first_point:
-                        coordinates.append(T.transform_point(first_point))
+                        path_builder.add_point(first_point)
                     closed = True
                     first_point = None
                     # Close current pptx_geometry and start a new one...
 
                 elif c.tag == DML('cubicBezTo'):
-                    coords = [BezierPoint(*T.transform_point(current_point))]
+                    coords = [current_point]
                     for p in c.getchildren():
                         pt = pptx_geometry.point(p)
-                        coords.append(BezierPoint(*T.transform_point(pt)))
+                        coords.append(pt)
                         current_point = pt
-                    bz = CubicBezier(*coords)
-                    bezier_segments.append(bz)
-                    coordinates.extend(bezier_sample(bz))
+                    if save_beziers:
+                        bezier_segments.append(CubicBezier(*[BezierPoint(*pt) for pt in T.transform_points(coords)]))
+                    path_builder.add_bezier(coords)
 
                 elif c.tag == DML('lnTo'):
                     pt = pptx_geometry.point(c.pt)
                     if moved:
-                        coordinates.append(T.transform_point(current_point))
+                        path_builder.add_point(current_point)
                         moved = False
-                    coordinates.append(T.transform_point(pt))
+                    path_builder.add_point(pt)
                     current_point = pt
 
                 elif c.tag == DML('moveTo'):
@@ -218,21 +289,23 @@ class PowerpointSlide(FeatureLayer):
                     moved = True
 
                 elif c.tag == DML('quadBezTo'):
-                    coords = [BezierPoint(*T.transform_point(current_point))]
+                    coords = [current_point]
                     for p in c.getchildren():
                         pt = pptx_geometry.point(p)
-                        coords.append(BezierPoint(*T.transform_point(pt)))
+                        coords.append(pt)
                         current_point = pt
-                    bz = QuadraticBezier(*coords)
-                    bezier_segments.append(bz)
-                    coordinates.extend(bezier_sample(bz))
+                    if save_beziers:
+                        bezier_segments.append(QuadraticBezier(*[BezierPoint(*pt) for pt in T.transform_points(coords)]))
+                    path_builder.add_bezier(coords)
 
                 else:
                     print('Unknown path element: {}'.format(c.tag))
 
-        if settings.get('saveBeziers', False) and len(bezier_segments) > 0:
+        if save_beziers and len(bezier_segments) > 0:
             properties['bezier-segments'] = [repr(bz) for bz in bezier_segments]
 
+        coordinates = path_builder.coordinates()
+
         if closed:
             geometry = shapely.geometry.Polygon(coordinates)
         else:
@@ -18,9 +18,12 @@
 #
 #===============================================================================
 
-import io
+import collections
+from concurrent.futures import ProcessPoolExecutor
+import contextlib
+import copy
 import os
-import re
+import tempfile
 
 #===============================================================================
 
@@ -36,17 +39,21 @@ import shapely.geometry
 #===============================================================================
 
 from .. import MapSource, RasterSource
+from .. import initialise_worker, WorkerSource
 from .. import WORLD_METRES_PER_PIXEL
 from ..markup import parse_markup
 
-from .cleaner import SVGCleaner
+from .cleaner import SVGCleaner, SVGStreamCleaner
+from .pathdata import parse_path_data, path_segments
 from .definitions import DefinitionStore
-from .transform import SVGTransform
-from .utils import adobe_decode, length_as_pixels, SVG_NS
+from .transform import compose_transform
+from .utils import adobe_decode, iterparse_svg, length_as_pixels, SVG_NS
 
 from mapmaker.flatmap.layers import FeatureLayer
-from mapmaker.geometry import bezier_sample, radians, Transform, reflect_point
-from mapmaker.geometry.arc_to_bezier import bezier_paths_from_arc_endpoints, tuple2
+from mapmaker.geometry import radians, Transform
+from mapmaker.geometry.arc_to_bezier import bezier_control_points_from_arc_endpoints
+from mapmaker.geometry.arc_to_bezier import bezier_path_from_control_points, tuple2
+from mapmaker.geometry.curves import PathBuilder
 from mapmaker.settings import settings
 from mapmaker.utils import path_open, ProgressBar
 
@@ -62,6 +69,11 @@ IGNORED_SVG_TAGS = [
     SVG_NS('text'),
 ]
 
+# The number of top-level elements and results waiting to be merged, for each
+# worker process, when processing in parallel
+
+MAX_PENDING_PER_JOB = 4
+
 #===============================================================================
 
 class SVGSource(MapSource):
@@ -69,12 +81,20 @@ class SVGSource(MapSource):
         super().__init__(flatmap, id)
         self.__source_path = source_path
         self.__base_layer = base_layer
-        self.__svg = etree.parse(path_open(source_path)).getroot()
-        if 'viewBox' in self.__svg.attrib:
-            (width, height) = tuple(float(x) for x in self.__svg.attrib['viewBox'].split()[2:])
+        if settings.get('streamSVG', False):
+            # Only read the root element now, the document is parsed as it's processed
+            self.__svg_tree = None
+            with path_open(source_path) as source_file:
+                for (_, svg) in etree.iterparse(source_file, events=('start',)):
+                    break
+        else:
+            self.__svg_tree = etree.parse(path_open(source_path))
+            svg = self.__svg_tree.getroot()
+        if 'viewBox' in svg.attrib:
+            (width, height) = tuple(float(x) for x in svg.attrib['viewBox'].split()[2:])
         else:
-            width = length_as_pixels(self.__svg.attrib['width'])
-            height = length_as_pixels(self.__svg.attrib['height'])
+            width = length_as_pixels(svg.attrib['width'])
+            height = length_as_pixels(svg.attrib['height'])
         # Transform from SVG pixels to world coordinates
         self.__transform = Transform([[WORLD_METRES_PER_PIXEL,                      0, 0],
                                       [                     0, WORLD_METRES_PER_PIXEL, 0],
@@ -89,6 +109,7 @@ class SVGSource(MapSource):
         self.add_layer(self.__layer)
         self.__raster_source = None
         self.__boundary_geometry = None
+        self.__temporary_directory = None
 
     @property
     def boundary_geometry(self):
@@ -104,24 +125,54 @@ class SVGSource(MapSource):
 
     def process(self):
     #=================
-        self.__layer.process(self.__svg)
+        if self.__svg_tree is None:
+            self.__process_stream()
+        else:
+            self.__process_tree()
         if self.__layer.boundary_id is not None:
             self.__boundary_geometry = self.__layer.features_by_id.get(self.__layer.boundary_id).geometry
+
+    def __process_tree(self):
+    #========================
+        self.__layer.process(self.__svg_tree.getroot())
+        if self.__base_layer or settings.get('backgroundTiles', False):
+            # Find what to exclude from the SVG in one pass, without changing our tree
+            cleaner = SVGCleaner(self.__svg_tree, self.flatmap.map_properties)
+            cleaner.clean()
         if self.__base_layer:
             # Save a cleaned copy of the SVG in the map's output directory
-            cleaner = SVGCleaner(self.__source_path, self.flatmap.map_properties)
-            cleaner.clean()
-            with open(os.path.join(settings.get('output'),
-                      self.flatmap.id,
-                      '{}.svg'.format(self.id)), 'wb') as fp:
+            with open(self.__cleaned_svg_path(), 'wb') as fp:
                 cleaner.save(fp)
         if settings.get('backgroundTiles', False):
-            cleaner = SVGCleaner(self.__source_path, self.flatmap.map_properties, all_layers=False)
-            cleaner.clean()
-            cleaned_svg = io.BytesIO()
-            cleaner.save(cleaned_svg)
-            cleaned_svg.seek(0)
-            self.__raster_source = RasterSource('svg', cleaned_svg)
+            # The rasteriser uses the filtered tree directly
+            self.__raster_source = RasterSource('svg', cleaner.filtered(all_layers=False))
+
+    def __process_stream(self):
+    #==========================
+        with contextlib.ExitStack() as exit_stack:
+            elements = iterparse_svg(exit_stack.enter_context(path_open(self.__source_path)))
+            root = next(elements)
+            # Cleaned copies are written as each top-level element is finished with
+            outputs = []
+            if self.__base_layer:
+                outputs.append((exit_stack.enter_context(open(self.__cleaned_svg_path(), 'wb')), True))
+            if settings.get('backgroundTiles', False):
+                # The rasteriser parses the whole of the cleaned SVG, so rather than
+                # keeping it in memory until then it's written to a temporary file,
+                # which is removed along with its directory when we are
+                self.__temporary_directory = tempfile.TemporaryDirectory()
+                raster_svg_path = os.path.join(self.__temporary_directory.name, '{}.svg'.format(self.id))
+                outputs.append((exit_stack.enter_context(open(raster_svg_path, 'wb')), False))
+            if len(outputs):
+                cleaner = exit_stack.enter_context(SVGStreamCleaner(root, self.flatmap.map_properties, outputs))
+                elements = cleaner.filter(elements)
+            self.__layer.process(elements)
+        if settings.get('backgroundTiles', False):
+            self.__raster_source = RasterSource('svg', raster_svg_path)
+
+    def __cleaned_svg_path(self):
+    #============================
+        return os.path.join(settings.get('output'), self.flatmap.id, '{}.svg'.format(self.id))
 
 #===============================================================================
 
@@ -131,38 +182,166 @@ class SVGLayer(FeatureLayer):
         self.__transform = source.transform
         self.__current_group = []
         self.__definitions = DefinitionStore()
+        self.__local_paths = {}
+        # Changes to the flatmap and source, recorded when in a worker process
+        self.__changes = None
 
     def process(self, svg):
     #======================
         self.__current_group.append('ROOT')
-        features = self.__process_element_list(svg, self.__transform, show_progress=True)
+        jobs = settings.get('jobs', 1)
+        if jobs > 1:
+            features = self.__process_in_parallel(svg, jobs)
+        else:
+            features = self.__process_element_list(svg, self.__transform, show_progress=True)
         self.add_features('SVG', features, outermost=True)
 
+    def process_worker_group(self, definitions, group):
+    #==================================================
+        """
+        Process a top-level group in a worker process.
+
+        :param definitions: the definitions preceding the group
+        :type definitions: :class:`DefinitionStore`
+        :param group: the serialised group
+        :type group: bytes
+        :returns: All features made, in id order, the features added to the layer,
+                  changes to be made to the flatmap and source, in order, and the
+                  group's own features.
+        :rtype: tuple
+        """
+        self.__changes = []
+        self.__definitions = definitions
+        self.__current_group.append('ROOT')
+        features = []
+        self.__process_element(etree.fromstring(group), self.__transform, features)
+        return (self.flatmap.features, self.features, self.__changes, features)
+
+    def __process_in_parallel(self, elements, jobs):
+    #===============================================
+        # Top-level groups are processed by a pool of worker processes. Their
+        # results, and any other top-level elements, are then merged in document
+        # order, so that features are numbered as if processed sequentially.
+        progress_bar = ProgressBar(
+            total=len(elements) if hasattr(elements, '__len__') else None,
+            unit='shp', ncols=40,
+            bar_format='{l_bar}{bar}| {n_fmt}/{total_fmt}')
+        features = []
+        pending = collections.deque()
+        with contextlib.ExitStack() as exit_stack:
+            # Definitions are appended to a file as they are found, with each group
+            # sent the file's length so that a worker only reads definitions it
+            # hasn't already seen, rather than them all being sent with every group
+            temporary_directory = exit_stack.enter_context(tempfile.TemporaryDirectory())
+            definitions_path = os.path.join(temporary_directory, 'definitions.xml')
+            definitions_file = exit_stack.enter_context(open(definitions_path, 'wb'))
+            executor = exit_stack.enter_context(ProcessPoolExecutor(max_workers=jobs,
+                                                    initializer=initialise_worker,
+                                                    initargs=(settings.copy(),)))
+            for element in elements:
+                if element.tag == SVG_NS('g'):
+                    definitions_file.flush()
+                    future = executor.submit(process_worker_group, self.id, self.base_layer,
+                                             self.__transform, definitions_path,
+                                             definitions_file.tell(), etree.tostring(element))
+                    # Definitions within a group are available to everything after it
+                    group_defs = [etree.tostring(defs) for defs in group_definitions(element)]
+                    for defs in group_defs:
+                        definitions_file.write(defs)
+                    pending.append((future, group_defs))
+                else:
+                    if element.tag == SVG_NS('defs'):
+                        definitions_file.write(etree.tostring(element))
+                    # Elements may be cleared when streaming so keep a copy
+                    pending.append(copy.copy(element))
+                # Limit the number of elements and results held in memory
+                while len(pending) > MAX_PENDING_PER_JOB*jobs:
+                    self.__merge_pending(pending.popleft(), features)
+                    progress_bar.update(1)
+            while len(pending):
+                self.__merge_pending(pending.popleft(), features)
+                progress_bar.update(1)
+        progress_bar.close()
+        return features
+
+    def __merge_pending(self, item, features):
+    #=========================================
+        if isinstance(item, tuple):
+            (future, definitions) = item
+            self.__merge_worker_group(future.result(), features)
+            for defs in definitions:
+                self.__definitions.add_definitions(etree.fromstring(defs))
+        else:
+            self.__process_list_element(item, self.__transform, features)
+
+    def __merge_worker_group(self, result, features):
+    #================================================
+        (new_features, layer_features, changes, group_features) = result
+        last_feature_id = self.flatmap.reserve_feature_ids(len(new_features))
+        for feature in new_features:
+            feature.feature_id += last_feature_id
+        for change in changes:
+            if change[0] == 'check':
+                self.__check_feature_id(*change[1:])
+            elif change[0] == 'error':
+                self.source.error(change[1])
+            elif change[0] == 'save':
+                self.flatmap.save_feature_id(change[1])
+        for feature in layer_features:
+            self.add_feature(feature)
+        features.extend(group_features)
+
     def __process_group(self, group, properties, transform):
     #=======================================================
         features = self.__process_element_list(group,
-            transform@SVGTransform(group.attrib.get('transform')))
+            compose_transform(transform, group.attrib.get('transform')))
         return self.add_features(adobe_decode(group.attrib.get('id', '')), features)
 
     def __process_element_list(self, elements, transform, show_progress=False):
     #==========================================================================
         progress_bar = ProgressBar(show=show_progress,
-            total=len(elements),
+            total=len(elements) if hasattr(elements, '__len__') else None,
             unit='shp', ncols=40,
             bar_format='{l_bar}{bar}| {n_fmt}/{total_fmt}')
         features = []
         for element in elements:
-            if element.tag == SVG_NS('defs'):
-                self.__definitions.add_definitions(element)
-                progress_bar.update(1)
-                continue
-            elif element.tag == SVG_NS('use'):
-                element = self.__definitions.use(element)
-            self.__process_element(element, transform, features)
+            self.__process_list_element(element, transform, features)
             progress_bar.update(1)
         progress_bar.close()
         return features
 
+    def __process_list_element(self, element, transform, features):
+    #==============================================================
+        if element.tag == SVG_NS('defs'):
+            self.__definitions.add_definitions(element)
+            return
+        elif element.tag == SVG_NS('use'):
+            element = self.__definitions.use(element)
+            if element is None:
+                return
+        self.__process_element(element, transform, features)
+
+    def __check_feature_id(self, id, message):
+    #=========================================
+        if self.__changes is not None:
+            self.__changes.append(('check', id, message))
+        elif self.flatmap.is_duplicate_feature_id(id):
+            self.source.error(message)
+
+    def __error(self, message):
+    #==========================
+        if self.__changes is not None:
+            self.__changes.append(('error', message))
+        else:
+            self.source.error(message)
+
+    def __save_feature_id(self, feature):
+    #====================================
+        if self.__changes is not None:
+            self.__changes.append(('save', feature))
+        else:
+            self.flatmap.save_feature_id(feature)
+
     def __process_element(self, element, transform, features):
     #=========================================================
         properties = {'tile-layer': 'features'}   # Passed through to map viewer
@@ -173,16 +352,16 @@ class SVGLayer(FeatureLayer):
             properties.update(parse_markup(markup))
             group_name = self.__current_group[-1]  # For error reporting
             if 'error' in properties:
-                self.source.error('{} error: {}: annotation syntax error: {}'
-                                    .format(self.id, group_name, markup))
+                self.__error('{} error: {}: annotation syntax error: {}'
+                                .format(self.id, group_name, markup))
             if 'warning' in properties:
-                self.source.error('{} warning: {}: {}'
-                                    .format(self.id, group_name, properties['warning']))
+                self.__error('{} warning: {}: {}'
+                                .format(self.id, group_name, properties['warning']))
             for key in ['id', 'path']:
                 if key in properties:
-                    if self.flatmap.is_duplicate_feature_id(properties[key]):
-                       self.source.error('{} error: {}: duplicate id: {}'
-                                           .format(self.id, group_name, markup))
+                    self.__check_feature_id(properties[key],
+                                            '{} error: {}: duplicate id: {}'
+                                                .format(self.id, group_name, markup))
         if 'error' in properties:
             pass
         elif 'path' in properties:
@@ -196,7 +375,7 @@ class SVGLayer(FeatureLayer):
             feature = self.flatmap.new_feature(geometry, properties)
             if self.base_layer and not feature.get_property('group'):
                 # Save relationship between id/class and internal feature id
-                self.flatmap.save_feature_id(feature)
+                self.__save_feature_id(feature)
             features.append(feature)
         elif element.tag == SVG_NS('g'):
             self.__current_group.append(properties.get('markup', "''"))
@@ -204,38 +383,72 @@ class SVGLayer(FeatureLayer):
             self.__current_group.pop()
             if grouped_feature is not None:
                 if self.base_layer:
-                    self.flatmap.save_feature_id(grouped_feature)
+                    self.__save_feature_id(grouped_feature)
                 features.append(grouped_feature)
         elif element.tag in IGNORED_SVG_TAGS:
             pass
         else:
             print('"{}" {} not processed...'.format(markup, element.tag))
 
-    @staticmethod
-    def __path_matcher(m):
-    #=====================
-    # Helper for parsing `d` attrib of a path
-        c = m[0]
-        if c.isalpha(): return ' ' + c + ' '
-        if c == '-': return ' -'
-        if c == ',': return ' '
-        return c
-
     def __get_geometry(self, element, properties, transform):
     #=======================================================
     ##
     ## Returns path element as a `shapely` object.
     ##
-        coordinates = []
-        bezier_segments = []
+        # Shapes in definitions are built once, in local coordinates, and then
+        # shared by every use of the definition
+        key = self.__definitions.shape_key(element)
+        if key is not None and key in self.__local_paths:
+            local_path = self.__local_paths[key]
+        else:
+            local_path = self.__local_path(element)
+            if key is not None:
+                self.__local_paths[key] = local_path
+        if local_path is None:
+            return None
+        (path_builder, closed, curves) = local_path
+
+        T = compose_transform(transform, element.attrib.get('transform'))
+        # Points are in the element's coordinates and transformed together by the builder
+        path_builder = path_builder.with_transform(T)
+        if settings.get('saveBeziers', False):
+            bezier_segments = []
+            for (cmd, coords) in curves:
+                if cmd == 'A':
+                    bezier_segments.extend(bezier_path_from_control_points(
+                        T.transform_points(coords).reshape(-1, 4, 2)).asSegments())
+                elif cmd == 'C':
+                    bezier_segments.append(CubicBezier(*[BezierPoint(*pt) for pt in T.transform_points(coords)]))
+                elif cmd == 'Q':
+                    bezier_segments.append(QuadraticBezier(*[BezierPoint(*pt) for pt in T.transform_points(coords)]))
+            if len(bezier_segments) > 0:
+                properties['bezier-segments'] = [repr(bz) for bz in bezier_segments]
+
+        coordinates = path_builder.coordinates()
+
+        if closed:
+            geometry = shapely.geometry.Polygon(coordinates)
+        else:
+            geometry = shapely.geometry.LineString(coordinates)
+            if properties.get('closed', False):
+                # Return a polygon if flagged as `closed`
+                coordinates.append(coordinates[0])
+                return shapely.geometry.Polygon(coordinates)
+        return geometry
+
+    def __local_path(self, element):
+    #===============================
+    ##
+    ## Returns a shape's path in its local coordinates, whether the path is
+    ## closed, and its curves, or None if the shape is empty.
+    ##
+        path_builder = PathBuilder()
+        curves = []
         moved = False
-        first_point = None
-        current_point = None
         closed = False
-
-        T = transform@SVGTransform(element.attrib.get('transform'))
+        segments = None
         if element.tag == SVG_NS('path'):
-            path_tokens = re.sub('.', SVGLayer.__path_matcher, element.attrib.get('d', '')).split()
+            segments = parse_path_data(element.attrib.get('d', ''))
 
         elif element.tag == SVG_NS('rect'):
             x = length_as_pixels(element.attrib.get('x', 0))
@@ -313,148 +526,94 @@ class SVGLayer(FeatureLayer):
                            'A', rx, ry, 0, 0, 0, cx+rx, cy,
                            'Z']
 
-        pos = 0
-        while pos < len(path_tokens):
-            if isinstance(path_tokens[pos], str) and path_tokens[pos].isalpha():
-                cmd = path_tokens[pos]
-                pos += 1
-            # Else repeat previous command with new coordinates
-            # with `moveTo` becoming `lineTo`
-            elif cmd == 'M':
-                cmd = 'L'
-            elif cmd == 'm':
-                cmd = 'l'
-
-            if cmd not in ['s', 'S']:
-                second_cubic_control = None
-            if cmd not in ['t', 'T']:
-                second_quad_control = None
-
-            if cmd in ['a', 'A']:
-                params = [float(x) for x in path_tokens[pos:pos+7]]
-                pos += 7
-                pt = params[5:7]
-                if cmd == 'a':
-                    pt[0] += current_point[0]
-                    pt[1] += current_point[1]
-                phi = radians(params[2])
-                paths = bezier_paths_from_arc_endpoints(tuple2(*params[0:2]), phi, *params[3:5],
-                                                        tuple2(*current_point), tuple2(*pt), T)
-                bezier_segments.extend(paths.asSegments())
-                coordinates.extend(bezier_sample(paths))
-                current_point = pt
-
-            elif cmd in ['c', 'C', 's', 'S']:
-                coords = [BezierPoint(*T.transform_point(current_point))]
-                if cmd in ['c', 'C']:
-                    n_params = 6
-                else:
-                    n_params = 4
-                    if second_cubic_control is None:
-                        coords.append(BezierPoint(*T.transform_point(current_point)))
-                    else:
-                        coords.append(BezierPoint(*T.transform_point(
-                            reflect_point(second_cubic_control, current_point))))
-                params = [float(x) for x in path_tokens[pos:pos+n_params]]
-                pos += n_params
-                for n in range(0, n_params, 2):
-                    pt = params[n:n+2]
-                    if cmd.islower():
-                        pt[0] += current_point[0]
-                        pt[1] += current_point[1]
-                    if n == (n_params - 4):
-                        second_cubic_control = pt
-                    coords.append(BezierPoint(*T.transform_point(pt)))
-                bz = CubicBezier(*coords)
-                bezier_segments.append(bz)
-                coordinates.extend(bezier_sample(bz))
-                current_point = pt
-
-            elif cmd in ['l', 'L', 'h', 'H', 'v', 'V']:
-                if cmd in ['l', 'L']:
-                    params = [float(x) for x in path_tokens[pos:pos+2]]
-                    pos += 2
-                    pt = params[0:2]
-                    if cmd == 'l':
-                        pt[0] += current_point[0]
-                        pt[1] += current_point[1]
-                else:
-                    param = float(path_tokens[pos])
-                    pos += 1
-                    if cmd == 'h':
-                        param += current_point[0]
-                    elif cmd == 'v':
-                        param += current_point[1]
-                    if cmd in ['h', 'H']:
-                        pt = [param, current_point[1]]
-                    else:
-                        pt = [current_point[0], param]
+        if segments is None:
+            segments = path_segments(path_tokens)
+
+        for segment in segments:
+            cmd = segment[0]
+            if cmd == 'A':
+                (current_point, rx, ry, phi, large_arc_flag, sweep_flag, pt) = segment[1:]
+                control_points = bezier_control_points_from_arc_endpoints(tuple2(rx, ry), radians(phi),
+                                    large_arc_flag, sweep_flag, tuple2(*current_point), tuple2(*pt))
+                curves.append((cmd, control_points))
+                path_builder.add_beziers(control_points)
+
+            elif cmd == 'C':
+                coords = segment[1:]
+                curves.append((cmd, coords))
+                path_builder.add_bezier(coords)
+
+            elif cmd == 'L':
                 if moved:
-                    coordinates.append(T.transform_point(current_point))
+                    path_builder.add_point(segment[1])
                     moved = False
-                coordinates.append(T.transform_point(pt))
-                current_point = pt
-
-            elif cmd in ['m', 'M']:
-                params = [float(x) for x in path_tokens[pos:pos+2]]
-                pos += 2
-                pt = params[0:2]
-                if first_point is None:
-                    # First `m` in a path is treated as `M`
-                    first_point = pt
-                else:
-                    if cmd == 'm':
-                        pt[0] += current_point[0]
-                        pt[1] += current_point[1]
-                current_point = pt
+                path_builder.add_point(segment[2])
+
+            elif cmd == 'M':
                 moved = True
 
-            elif cmd in ['q', 'Q', 't', 'T']:
-                coords = [BezierPoint(*T.transform_point(current_point))]
-                if cmd in ['q', 'Q']:
-                    n_params = 4
-                else:
-                    n_params = 2
-                    if second_quad_control is None:
-                        coords.append(BezierPoint(*T.transform_point(current_point)))
-                    else:
-                        coords.append(BezierPoint(*T.transform_point(
-                            reflect_point(second_quad_control, current_point))))
-                params = [float(x) for x in path_tokens[pos:pos+n_params]]
-                pos += n_params
-                for n in range(0, n_params, 2):
-                    pt = params[n:n+2]
-                    if cmd.islower():
-                        pt[0] += current_point[0]
-                        pt[1] += current_point[1]
-                    if n == (n_params - 4):
-                        second_quad_control = pt
-                    coords.append(BezierPoint(*T.transform_point(pt)))
-                bz = QuadraticBezier(*coords)
-                bezier_segments.append(bz)
-                coordinates.extend(bezier_sample(bz))
-                current_point = pt
-
-            elif cmd in ['z', 'Z']:
+            elif cmd == 'Q':
+                coords = segment[1:]
+                curves.append((cmd, coords))
+                path_builder.add_bezier(coords)
+
+            elif cmd == 'Z':
+                (current_point, first_point) = segment[1:]
                 if first_point is not None and current_point != first_point:
-                    coordinates.append(T.transform_point(first_point))
+                    path_builder.add_point(first_point)
                 closed = True
-                first_point = None
 
-            else:
-                print('Unknown path command: {}'.format(cmd))
+        return (path_builder, closed, curves)
 
-        if settings.get('saveBeziers', False) and len(bezier_segments) > 0:
-            properties['bezier-segments'] = [repr(bz) for bz in bezier_segments]
+#===============================================================================
 
-        if closed:
-            geometry = shapely.geometry.Polygon(coordinates)
-        else:
-            geometry = shapely.geometry.LineString(coordinates)
-            if properties.get('closed', False):
-                # Return a polygon if flagged as `closed`
-                coordinates.append(coordinates[0])
-                return shapely.geometry.Polygon(coordinates)
-        return geometry
+def group_definitions(group):
+#============================
+    """
+    The ``<defs>`` elements of a group and of its subgroups, in document order.
+    """
+    for element in group:
+        if element.tag == SVG_NS('defs'):
+            yield element
+        elif element.tag == SVG_NS('g'):
+            yield from group_definitions(element)
+
+# A worker's definitions, along with the file they are read from and how much
+# of it has been read
+
+__worker_definitions = None
+
+def worker_definitions(path, length):
+#====================================
+    """
+    The definitions in the first ``length`` bytes of a file of serialised
+    ``<defs>`` elements, reading only what the worker hasn't already read.
+
+    A worker is given groups in document order, so definitions added while
+    processing a group precede those of any later group and can be kept.
+
+    :rtype: :class:`DefinitionStore`
+    """
+    global __worker_definitions
+    if __worker_definitions is None or __worker_definitions[0] != path:
+        __worker_definitions = [path, 0, DefinitionStore()]
+    (_, position, definitions) = __worker_definitions
+    if length > position:
+        with open(path, 'rb') as fp:
+            fp.seek(position)
+            for defs in etree.fromstring(b'<definitions>' + fp.read(length - position) + b'</definitions>'):
+                definitions.add_definitions(defs)
+        __worker_definitions[1] = length
+    return definitions
+
+def process_worker_group(layer_id, base_layer, transform, definitions_path, definitions_length, group):
+#=====================================================================================================
+    """
+    Process a serialised top-level SVG group in a worker process.
+
+    See :meth:`SVGLayer.process_worker_group`.
+    """
+    layer = SVGLayer(layer_id, WorkerSource(transform), base_layer)
+    return layer.process_worker_group(worker_definitions(definitions_path, definitions_length), group)
 
 #===============================================================================
@@ -18,6 +18,7 @@
 #
 #===============================================================================
 
+import copy
 from datetime import datetime, timezone
 
 #===============================================================================
@@ -27,7 +28,6 @@ from lxml import etree
 #===============================================================================
 
 from mapmaker import __version__
-from mapmaker.utils import path_open
 
 from .. import EXCLUDE_SHAPE_TYPES, EXCLUDE_TILE_LAYERS
 from ..markup import parse_markup
@@ -35,44 +35,165 @@ from .utils import adobe_decode
 
 #===============================================================================
 
+def generator_comment():
+#=======================
+    return etree.Comment(' Generator: mapmaker {} at {} '.format(__version__,
+                                                                datetime.now(timezone.utc).isoformat()))
+
+def element_exclusion(element, map_properties):
+#==============================================
+    """
+    :returns: ``None`` if the element is kept, ``False`` if it is excluded from
+              all layers, and ``True`` if it is only excluded from rasterising.
+    """
+    if element.attrib.get('id', '').startswith('_x2E_'):
+        markup = adobe_decode(element.attrib['id'])
+        properties = map_properties.update_feature_properties(parse_markup(markup))
+        tiles_only = None
+        for key, value in properties.items():
+            if key in EXCLUDE_SHAPE_TYPES:
+                return False
+            elif key == 'tile-layer' and value in EXCLUDE_TILE_LAYERS:
+                tiles_only = True
+        return tiles_only
+    return None
+
+def excluded_elements(element, map_properties):
+#==============================================
+    """
+    Find the elements to remove from an element's subtree, including the
+    element itself.
+
+    :returns: Excluded elements along with whether each is only excluded
+              from rasterising.
+    :rtype: list(tuple(element, bool))
+    """
+    exclude = element_exclusion(element, map_properties)
+    if exclude is False:
+        return [(element, False)]
+    excluded = [] if exclude is None else [(element, True)]
+    for child in element:
+        excluded.extend(excluded_elements(child, map_properties))
+    return excluded
+
+#===============================================================================
+
 class SVGCleaner(object):
-    def __init__(self, svg_file, map_properties, all_layers=True):
-        self.__svg = etree.parse(path_open(svg_file))
+    """
+    Remove excluded shapes from a parsed SVG document.
+
+    The document itself is left unchanged. A single pass over it finds what
+    is to be removed, both for the saved copy of the SVG (``all_layers``) and
+    for rasterising (where tile layers in ``EXCLUDE_TILE_LAYERS`` are also
+    removed), and :meth:`filtered` then returns a cleaned copy.
+
+    :param svg: the parsed SVG document
+    :type svg: :class:`lxml.etree._ElementTree`
+    """
+    def __init__(self, svg, map_properties):
+        self.__svg = svg
         self.__map_properties = map_properties
-        self.__all_layers = all_layers
+        self.__excluded = []
 
     def clean(self):
     #===============
-        self.__filter(self.__svg.getroot())
+        self.__excluded = excluded_elements(self.__svg.getroot(), self.__map_properties)
 
-    def save(self, file_object):
-    #===========================
-        header = ' Generator: mapmaker {} at {} '.format(__version__, datetime.now(timezone.utc).isoformat())
-        comments = self.__svg.xpath('/comment()')
+    def filtered(self, all_layers=True):
+    #===================================
+        """
+        :param all_layers: keep shapes on tile layers excluded from rasterising
+        :returns: A copy of the SVG document without excluded shapes.
+        :rtype: :class:`lxml.etree._ElementTree`
+        """
+        positions = { element: n for (n, element) in enumerate(self.__svg.getroot().iter()) }
+        svg = copy.deepcopy(self.__svg)
+        elements = list(svg.getroot().iter())
+        for (element, tiles_only) in self.__excluded:
+            if not (all_layers and tiles_only):
+                element = elements[positions[element]]
+                element.getparent().remove(element)
+        return svg
+
+    def save(self, file_object, all_layers=True):
+    #============================================
+        svg = self.filtered(all_layers)
+        header = generator_comment()
+        comments = svg.xpath('/comment()')
         if len(comments):
-            comments[0].text = header
+            comments[0].text = header.text
         else:
-            self.__svg.getroot().addprevious(etree.Comment(header))
-        self.__svg.write(file_object, encoding='utf-8', pretty_print=True, xml_declaration=True)
-
-    def __filter(self, element, parent=None):
-    #========================================
-        if self.__exclude(element):
-            parent.remove(element)
-            return
-        for child in element:
-            self.__filter(child, element)
-
-    def __exclude(self, element):
-    #============================
-        if element.attrib.get('id', '').startswith('_x2E_'):
-            markup = adobe_decode(element.attrib['id'])
-            properties = self.__map_properties.update_feature_properties(parse_markup(markup))
-            for key, value in properties.items():
-                if key in EXCLUDE_SHAPE_TYPES:
-                    return True
-                elif not self.__all_layers and key == 'tile-layer' and value in EXCLUDE_TILE_LAYERS:
-                    return True
-        return False
+            svg.getroot().addprevious(header)
+        svg.write(file_object, encoding='utf-8', pretty_print=True, xml_declaration=True)
+
+#===============================================================================
+
+class SVGStreamCleaner(object):
+    """
+    Write cleaned copies of an SVG document that is being parsed incrementally,
+    one top-level element at a time.
+
+    :param root: the document's root element
+    :param map_properties: the flatmap's properties
+    :param outputs: where to write cleaned copies, each along with whether
+                    shapes excluded from rasterising are kept
+    :type outputs: list(tuple(file object, bool))
+    """
+    def __init__(self, root, map_properties, outputs):
+        self.__map_properties = map_properties
+        # Removal is cumulative, so write the copies with all layers first
+        self.__outputs = sorted(outputs, key=lambda output: not output[1])
+        # Serialise an empty copy of the root to get its start and end tags
+        svg = etree.Element(root.tag, nsmap=root.nsmap)
+        svg.attrib.update(root.attrib)
+        svg.text = '\n'
+        svg = etree.tostring(svg, encoding='utf-8')
+        self.__root_end = svg.rindex(b'</')
+        self.__root_tags = svg
+        # Top-level elements are serialised as children of a root with the same
+        # namespaces, so that the root's declarations aren't repeated on each
+        self.__namespace_root = etree.Element(root.tag, nsmap=root.nsmap)
+
+    def __enter__(self):
+        header = b"<?xml version='1.0' encoding='utf-8'?>\n" + etree.tostring(generator_comment()) + b'\n'
+        for (file_object, _) in self.__outputs:
+            file_object.write(header)
+            file_object.write(self.__root_tags[:self.__root_end])
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        for (file_object, _) in self.__outputs:
+            file_object.write(self.__root_tags[self.__root_end:] + b'\n')
+
+    def filter(self, elements):
+    #==========================
+        """
+        Pass through top-level elements, writing each to the cleaned copies
+        once the caller has finished with it and asks for the next element.
+        """
+        for element in elements:
+            yield element
+            self.__write(element)
+
+    def __write(self, element):
+    #==========================
+        excluded = excluded_elements(element, self.__map_properties)
+        for (file_object, all_layers) in self.__outputs:
+            removed = False
+            for (excluded_element, tiles_only) in excluded:
+                if not (all_layers and tiles_only):
+                    if excluded_element is element:
+                        removed = True
+                    elif excluded_element.getparent() is not None:
+                        excluded_element.getparent().remove(excluded_element)
+            if not removed:
+                file_object.write(self.__serialise(element))
+
+    def __serialise(self, element):
+    #==============================
+        self.__namespace_root.append(copy.deepcopy(element))
+        svg = etree.tostring(self.__namespace_root, encoding='utf-8')
+        del self.__namespace_root[0]
+        return svg[svg.index(b'>') + 1:svg.rindex(b'</')]
 
 #===============================================================================
@@ -22,15 +22,51 @@ import copy
 
 #===============================================================================
 
+from .utils import SVG_NS
+
+#===============================================================================
+
+XLINK_HREF = '{http://www.w3.org/1999/xlink}href'
+
+# The attributes that determine a shape's geometry in its local coordinates
+
+GEOMETRY_ATTRIBUTES = {
+    SVG_NS('circle'): ('cx', 'cy', 'r'),
+    SVG_NS('ellipse'): ('cx', 'cy', 'rx', 'ry'),
+    SVG_NS('line'): ('x1', 'y1', 'x2', 'y2'),
+    SVG_NS('path'): ('d',),
+    SVG_NS('polygon'): ('points',),
+    SVG_NS('polyline'): ('points',),
+    SVG_NS('rect'): ('x', 'y', 'width', 'height', 'rx', 'ry'),
+}
+
+def geometry_key(element):
+#=========================
+    """
+    :returns: A key identifying a shape's geometry in its local coordinates,
+              or ``None`` if the element isn't a shape.
+    """
+    attributes = GEOMETRY_ATTRIBUTES.get(element.tag)
+    if attributes is None:
+        return None
+    return (element.tag,) + tuple(element.attrib.get(name) for name in attributes)
+
+#===============================================================================
+
 class DefinitionStore(object):
     def __init__(self):
         self.__definitions = {}
+        self.__shape_keys = set()
 
     def add_definition(self, element):
     #=================================
         id = element.attrib.get('id')
         if id is not None:
             self.__definitions[id] = element
+            for child in element.iter():
+                key = geometry_key(child)
+                if key is not None:
+                    self.__shape_keys.add(key)
 
     def add_definitions(self, defs_element):
     #=======================================
@@ -44,15 +80,28 @@ class DefinitionStore(object):
             if definition is not None:
                 return copy.copy(definition)
 
+    def shape_key(self, element):
+    #============================
+        """
+        Shapes that are part of a definition are drawn once for every use
+        of the definition, so callers can cache their local geometry.
+
+        :returns: The :func:`geometry_key` of a shape with the same geometry as
+                  one in a definition, otherwise ``None``.
+        """
+        key = geometry_key(element)
+        return key if key in self.__shape_keys else None
+
     def use(self, element):
     #======================
-        id = element.attrib.get('xlink:href')
+        href = XLINK_HREF if XLINK_HREF in element.attrib else 'href'
+        id = element.attrib.get(href)
         if id is not None and id.startswith('#'):
             definition = self.__definitions.get(id[1:])
             if definition is not None:
-                del element.attrib['xlink:href']
                 result = copy.copy(definition)
-                result.attrib.update(element.attrib)
+                result.attrib.update({ key: value for (key, value) in element.attrib.items()
+                                                    if key != href })
                 return result
         return None
 
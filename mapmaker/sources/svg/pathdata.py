@@ -0,0 +1,205 @@
+#===============================================================================
+#
+#  Flatmap viewer and annotation tools
+#
+#  Copyright (c) 2020  David Brooks
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+#===============================================================================
+
+"""
+Parse SVG path data into segments with absolute coordinates, for use by both
+the geometry builder and the rasteriser.
+
+Segments are tuples, starting with one of:
+
+* ``('M', point)``
+* ``('L', start, point)``
+* ``('C', start, control_1, control_2, point)``
+* ``('Q', start, control, point)``
+* ``('A', start, rx, ry, x_axis_rotation, large_arc_flag, sweep_flag, point)``
+* ``('Z', current_point, first_point)``
+
+Relative, shorthand and smooth commands are converted into these forms.
+"""
+
+#===============================================================================
+
+from functools import lru_cache
+import re
+
+#===============================================================================
+
+from mapmaker.geometry import reflect_point
+
+#===============================================================================
+
+PATH_TOKENS = re.compile(r'[MmZzLlHhVvCcSsQqTtAa]|[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?')
+
+#===============================================================================
+
+def path_tokens(path_data):
+#==========================
+    """
+    Split the ``d`` attribute of a ``<path>`` into command letters and numbers.
+
+    :rtype: list
+    """
+    return [token if token.isalpha() else float(token)
+                for token in PATH_TOKENS.findall(path_data)]
+
+@lru_cache(maxsize=1024)
+def parse_path_data(path_data):
+#==============================
+    """
+    Parse the ``d`` attribute of a ``<path>``. Results are cached, as identical
+    paths are often repeated.
+
+    :rtype: tuple(tuple)
+    """
+    return tuple(path_segments(path_tokens(path_data)))
+
+def relative_point(params, origin=None):
+#=======================================
+    # Points are tuples, as the segments of parsed paths are cached and shared
+    if origin is None:
+        return (params[0], params[1])
+    return (params[0] + origin[0], params[1] + origin[1])
+
+def path_segments(tokens):
+#=========================
+    """
+    Convert a list of path commands and their parameters into segments with
+    absolute coordinates.
+
+    :param tokens: command letters and numbers, as strings or numbers
+    :rtype: list(tuple)
+    """
+    segments = []
+    cmd = None
+    first_point = None
+    current_point = None
+    second_cubic_control = None
+    second_quad_control = None
+    pos = 0
+    while pos < len(tokens):
+        new_command = isinstance(tokens[pos], str) and tokens[pos].isalpha()
+        if new_command:
+            cmd = tokens[pos]
+            pos += 1
+        # Else repeat previous command with new coordinates
+        # with `moveTo` becoming `lineTo`
+        elif cmd == 'M':
+            cmd = 'L'
+        elif cmd == 'm':
+            cmd = 'l'
+
+        if cmd not in ['s', 'S']:
+            second_cubic_control = None
+        if cmd not in ['t', 'T']:
+            second_quad_control = None
+
+        if cmd in ['a', 'A']:
+            params = [float(x) for x in tokens[pos:pos+7]]
+            pos += 7
+            pt = relative_point(params[5:7], current_point if cmd == 'a' else None)
+            segments.append(('A', current_point, *params[0:5], pt))
+            current_point = pt
+
+        elif cmd in ['c', 'C', 's', 'S']:
+            coords = []
+            if cmd in ['c', 'C']:
+                n_params = 6
+            else:
+                n_params = 4
+                if second_cubic_control is None:
+                    coords.append(current_point)
+                else:
+                    coords.append(reflect_point(second_cubic_control, current_point))
+            params = [float(x) for x in tokens[pos:pos+n_params]]
+            pos += n_params
+            for n in range(0, n_params, 2):
+                pt = relative_point(params[n:n+2], current_point if cmd.islower() else None)
+                if n == (n_params - 4):
+                    second_cubic_control = pt
+                coords.append(pt)
+            segments.append(('C', current_point, *coords))
+            current_point = pt
+
+        elif cmd in ['l', 'L', 'h', 'H', 'v', 'V']:
+            if cmd in ['l', 'L']:
+                params = [float(x) for x in tokens[pos:pos+2]]
+                pos += 2
+                pt = relative_point(params[0:2], current_point if cmd == 'l' else None)
+            else:
+                param = float(tokens[pos])
+                pos += 1
+                if cmd == 'h':
+                    param += current_point[0]
+                elif cmd == 'v':
+                    param += current_point[1]
+                if cmd in ['h', 'H']:
+                    pt = (param, current_point[1])
+                else:
+                    pt = (current_point[0], param)
+            segments.append(('L', current_point, pt))
+            current_point = pt
+
+        elif cmd in ['m', 'M']:
+            params = [float(x) for x in tokens[pos:pos+2]]
+            pos += 2
+            if first_point is None:
+                # First `m` in a path is treated as `M`
+                pt = relative_point(params[0:2])
+                first_point = pt
+            else:
+                pt = relative_point(params[0:2], current_point if cmd == 'm' else None)
+            segments.append(('M', pt))
+            current_point = pt
+
+        elif cmd in ['q', 'Q', 't', 'T']:
+            coords = []
+            if cmd in ['q', 'Q']:
+                n_params = 4
+            else:
+                n_params = 2
+                if second_quad_control is None:
+                    coords.append(current_point)
+                else:
+                    coords.append(reflect_point(second_quad_control, current_point))
+            params = [float(x) for x in tokens[pos:pos+n_params]]
+            pos += n_params
+            for n in range(0, n_params, 2):
+                pt = relative_point(params[n:n+2], current_point if cmd.islower() else None)
+                if n == (n_params - 4):
+                    second_quad_control = pt
+                coords.append(pt)
+            segments.append(('Q', current_point, *coords))
+            current_point = pt
+
+        elif cmd in ['z', 'Z']:
+            segments.append(('Z', current_point, first_point))
+            first_point = None
+            if not new_command:
+                pos += 1
+
+        else:
+            print('Unknown path command: {}'.format(cmd))
+            if not new_command:
+                # Skip the unknown command's parameters
+                pos += 1
+
+    return segments
+
+#===============================================================================
@@ -19,7 +19,6 @@
 #===============================================================================
 
 import math
-import re
 
 #===============================================================================
 
@@ -38,11 +37,12 @@ import tinycss2
 from .. import WORLD_METRES_PER_PIXEL
 from .. import EXCLUDE_SHAPE_TYPES, EXCLUDE_TILE_LAYERS
 
-from mapmaker.geometry import degrees, radians, Transform, reflect_point
+from mapmaker.geometry import degrees, Identity, radians, Transform
 from mapmaker.utils import ProgressBar, log
 
 from .definitions import DefinitionStore
-from .transform import SVGTransform
+from .pathdata import parse_path_data, path_segments
+from .transform import compose_transform, SVGTransform
 from .utils import adobe_decode, length_as_pixels, SVG_NS
 
 #===============================================================================
@@ -81,18 +81,29 @@ class GradientStops(object):
 
 #===============================================================================
 
+def local_style(style_attribute):
+#================================
+    local_style = {}
+    if style_attribute is not None:
+        for declaration in tinycss2.parse_declaration_list(style_attribute,
+                                skip_comments=True, skip_whitespace=True):
+            local_style[declaration.lower_name] = ' '.join(
+                [t.serialize() for t in declaration.value])
+    return local_style
+
+#===============================================================================
+
 class ElementStyle(object):
-    def __init__(self, element, style_dict={}):
+    """
+    :param style_dict: styling from the style sheet, which must already include
+                       the element's ``style`` attribute, or ``None`` to only
+                       use the element's own styling
+    """
+    def __init__(self, element, style_dict=None):
         self.__attributes = element.attrib
+        if style_dict is None:
+            style_dict = local_style(self.__attributes.get('style'))
         self.__style_dict = style_dict
-        if 'style' in self.__attributes:
-            local_style = {}
-            for declaration in tinycss2.parse_declaration_list(
-                self.__attributes['style'],
-                skip_comments=True, skip_whitespace=True):
-                local_style[declaration.lower_name] = ' '.join(
-                    [t.serialize() for t in declaration.value])
-            self.__style_dict.update(local_style)
 
     def get(self, key, default=None):
     #================================
@@ -102,21 +113,37 @@ class ElementStyle(object):
 
 #===============================================================================
 
+# Selectors made up of only these match an element without regard to its
+# position in the document
+CONTEXT_FREE_SELECTORS = (cssselect2.parser.ClassSelector,
+                          cssselect2.parser.LocalNameSelector,
+                          cssselect2.parser.NamespaceSelector)
+
 class StyleMatcher(cssselect2.Matcher):
     '''Parse CSS and add rules to the matcher.'''
     def __init__(self, style_element):
         super().__init__()
+        # Styling resolved for a tag, class and style attribute, when no
+        # selector depends on anything else
+        self.__styles = {}
+        self.__context_free = True
         rules = tinycss2.parse_stylesheet(style_element.text
                     if style_element is not None else '',
                     skip_comments=True, skip_whitespace=True)
         for rule in rules:
-            selectors = cssselect2.compile_selector_list(rule.prelude)
+            if rule.type != 'qualified-rule':
+                continue
             declarations = [obj for obj in tinycss2.parse_declaration_list(
                                                rule.content,
                                                skip_whitespace=True)
                             if obj.type == 'declaration']
-            for selector in selectors:
-                self.add_selector(selector, declarations)
+            for selector in cssselect2.parser.parse(rule.prelude):
+                if (selector.pseudo_element is not None
+                 or not isinstance(selector.parsed_tree, cssselect2.parser.CompoundSelector)
+                 or not all(isinstance(simple_selector, CONTEXT_FREE_SELECTORS)
+                            for simple_selector in selector.parsed_tree.simple_selectors)):
+                    self.__context_free = False
+                self.add_selector(cssselect2.compiler.CompiledSelector(selector), declarations)
 
     def match(self, element):
     #========================
@@ -131,16 +158,28 @@ class StyleMatcher(cssselect2.Matcher):
 
     def element_style(self, wrapped_element):
     #========================================
-        return ElementStyle(wrapped_element.etree_element,
-                            { key: ' '.join([t.serialize() for t in value])
-                                for key, value in self.match(wrapped_element).items()
-                            })
+        element = wrapped_element.etree_element
+        key = ((element.tag, element.attrib.get('class'), element.attrib.get('style'))
+                if self.__context_free else None)
+        style_dict = self.__styles.get(key)
+        if style_dict is None:
+            style_dict = { name: ' '.join([t.serialize() for t in value])
+                            for name, value in self.match(wrapped_element).items()
+                         }
+            style_dict.update(local_style(element.attrib.get('style')))
+            if key is not None:
+                self.__styles[key] = style_dict
+        return ElementStyle(element, style_dict)
 
 #===============================================================================
 
 class SVGTiler(object):
     def __init__(self, raster_layer, tile_set):
-        self.__svg = etree.parse(raster_layer.source_data).getroot()
+        svg = raster_layer.source_data
+        if not isinstance(svg, etree._ElementTree):
+            # A cleaned SVG written while streaming its source
+            svg = etree.parse(svg)
+        self.__svg = svg.getroot()
         if 'viewBox' in self.__svg.attrib:
             self.__size = tuple(float(x)
                 for x in self.__svg.attrib['viewBox'].split()[2:])
@@ -150,6 +189,9 @@ class SVGTiler(object):
         self.__scaling = (tile_set.pixel_rect.width/self.__size[0],
                           tile_set.pixel_rect.height/self.__size[1])
         self.__definitions = DefinitionStore()
+        self.__local_paths = {}
+        self.__paints = {}
+        self.__gradient_stops = {}
         defs = self.__svg.find(SVG_NS('defs'))
         if defs is not None:
             self.__definitions.add_definitions(defs)
@@ -231,7 +273,7 @@ class SVGTiler(object):
     def __draw_group(self, group, transform, path_list):
     #===================================================
         self.__draw_element_list(group,
-            transform@SVGTransform(group.etree_element.attrib.get('transform')),
+            compose_transform(transform, group.etree_element.attrib.get('transform')),
             path_list)
 
     def __draw_element_list(self, elements, transform, path_list, show_progress=False):
@@ -245,6 +287,9 @@ class SVGTiler(object):
             element = wrapped_element.etree_element
             if element.tag == SVG_NS('use'):
                 element = self.__definitions.use(element)
+                if element is None:
+                    progress_bar.update(1)
+                    continue
                 wrapped_element = cssselect2.ElementWrapper.from_xml_root(element)
             elif element.tag in [SVG_NS('linearGradient'), SVG_NS('radialGradient')]:
                 if self.__first_scan:
@@ -303,73 +348,99 @@ class SVGTiler(object):
 
             path.setFillType(skia.PathFillType.kWinding)
             opacity = float(element_style.get('opacity', 1.0))
+            path_list.append((path, self.__get_paint(fill, opacity, path, transform)))
+
+    def __get_paint(self, fill, opacity, path, transform):
+    #=====================================================
+        # Paints are shared by all paths with the same fill
+        if fill.startswith('url('):
+            gradient = self.__definitions.lookup(fill[4:-1])
+            if gradient is None:
+                fill = '#800'     # Something's wrong show show in image...
+                opacity = 0.5
+            elif gradient.tag in [SVG_NS('linearGradient'), SVG_NS('radialGradient')]:
+                matrix = SVGTiler.__skia_matrix(gradient, path, transform)
+                key = (fill, tuple(matrix.get9()))
+                if key not in self.__paints:
+                    paint = skia.Paint(AntiAlias=True)
+                    paint.setShader(self.__gradient_shader(fill, gradient, matrix))
+                    self.__paints[key] = paint
+                return self.__paints[key]
+            else:
+                fill = '#008'     # Something's wrong show show in image...
+                opacity = 0.5
+        key = (fill, opacity)
+        if key not in self.__paints:
             paint = skia.Paint(AntiAlias=True)
-
-            if fill.startswith('url('):
-                gradient = self.__definitions.lookup(fill[4:-1])
-                if gradient is None:
-                    fill = '#800'     # Something's wrong show show in image...
-                    opacity = 0.5
-                elif gradient.tag == SVG_NS('linearGradient'):
-                    gradient_stops = GradientStops(gradient)
-                    points = [(float(gradient.attrib.get('x1', 0.0)),
-                               float(gradient.attrib.get('y1', 0.0))),
-                              (float(gradient.attrib.get('x2', 1.0)),
-                               float(gradient.attrib.get('y2', 0.0)))]
-                    paint.setShader(skia.GradientShader.MakeLinear(
-                        points=points,
-                        positions=gradient_stops.offsets,
-                        colors=gradient_stops.colours,
-                        localMatrix=SVGTiler.__skia_matrix(gradient, path, transform)
-                    ))
-                elif gradient.tag == SVG_NS('radialGradient'):
-                    gradient_stops = GradientStops(gradient)
-                    centre = (float(gradient.attrib.get('cx')),
-                              float(gradient.attrib.get('cy')))
-                    radius = float(gradient.attrib.get('r'))
-                    # TODO: fx, fy
-                    #       This will need a two point conical shader
-                    #       -- see chromium/blink sources
-                    paint.setShader(skia.GradientShader.MakeRadial(
-                        center=centre,
-                        radius=radius,
-                        positions=gradient_stops.offsets,
-                        colors=gradient_stops.colours,
-                        localMatrix=SVGTiler.__skia_matrix(gradient, path, transform)
-                    ))
-                else:
-                    fill = '#008'     # Something's wrong show show in image...
-                    opacity = 0.5
-
             if fill.startswith('#'):
                 paint.setColor(make_colour(fill, opacity))
-            path_list.append((path, paint))
-
+            self.__paints[key] = paint
+        return self.__paints[key]
 
-    @staticmethod
-    def __svg_path_matcher(m):
-    #=========================
-    # Helper for parsing `d` attrib of a path
-        c = m[0]
-        if c.isalpha(): return ' ' + c + ' '
-        if c == '-': return ' -'
-        if c == ',': return ' '
-        return c
+    def __gradient_shader(self, fill, gradient, matrix):
+    #===================================================
+        if fill not in self.__gradient_stops:
+            self.__gradient_stops[fill] = GradientStops(gradient)
+        gradient_stops = self.__gradient_stops[fill]
+        if gradient.tag == SVG_NS('linearGradient'):
+            points = [(float(gradient.attrib.get('x1', 0.0)),
+                       float(gradient.attrib.get('y1', 0.0))),
+                      (float(gradient.attrib.get('x2', 1.0)),
+                       float(gradient.attrib.get('y2', 0.0)))]
+            return skia.GradientShader.MakeLinear(
+                points=points,
+                positions=gradient_stops.offsets,
+                colors=gradient_stops.colours,
+                localMatrix=matrix
+            )
+        else:
+            centre = (float(gradient.attrib.get('cx')),
+                      float(gradient.attrib.get('cy')))
+            radius = float(gradient.attrib.get('r'))
+            # TODO: fx, fy
+            #       This will need a two point conical shader
+            #       -- see chromium/blink sources
+            return skia.GradientShader.MakeRadial(
+                center=centre,
+                radius=radius,
+                positions=gradient_stops.offsets,
+                colors=gradient_stops.colours,
+                localMatrix=matrix
+            )
 
     def __get_graphics_path(self, element, transform):
     #=================================================
-        T = transform@SVGTransform(element.attrib.get('transform'))
+        T = compose_transform(transform, element.attrib.get('transform'))
+        # Shapes in definitions are built once, in local coordinates, and then
+        # transformed for every use of the definition
+        key = self.__definitions.shape_key(element)
+        if key is None:
+            return self.__graphics_path(element, T)
+        if key not in self.__local_paths:
+            self.__local_paths[key] = self.__graphics_path(element, Identity())
+        local_path = self.__local_paths[key]
+        if local_path is None:
+            return None
+        return self.__transformed_path(local_path, T)
+
+    @staticmethod
+    def __transformed_path(path, T):
+    #===============================
+        transformed = skia.Path()
+        path.transform(skia.Matrix(list(T.flatten())), transformed)
+        return transformed
+
+    def __graphics_path(self, element, T):
+    #=====================================
         if element.tag == SVG_NS('path'):
-            tokens = re.sub('.', SVGTiler.__svg_path_matcher,
-                            element.attrib.get('d', '')).split()
-            path = self.__path_from_tokens(tokens, T)
+            path = self.__path_from_segments(parse_path_data(element.attrib.get('d', '')), T)
 
         elif element.tag == SVG_NS('rect'):
-            (width, height) = T.scale_length((length_as_pixels(element.attrib.get('width', 0)),
-                                              length_as_pixels(element.attrib.get('height', 0))))
+            width = length_as_pixels(element.attrib.get('width', 0))
+            height = length_as_pixels(element.attrib.get('height', 0))
             if width == 0 or height == 0: return None
-            (rx, ry) = T.scale_length((length_as_pixels(element.attrib.get('rx', 0)),
-                                       length_as_pixels(element.attrib.get('ry', 0))))
+            rx = length_as_pixels(element.attrib.get('rx')) if 'rx' in element.attrib else None
+            ry = length_as_pixels(element.attrib.get('ry')) if 'ry' in element.attrib else None
             if rx is None and ry is None:
                 rx = ry = 0
             elif ry is None:
@@ -378,193 +449,88 @@ class SVGTiler(object):
                 rx = ry
             rx = min(rx, width/2)
             ry = min(ry, height/2)
-            (x, y) = T.transform_point((length_as_pixels(element.attrib.get('x', 0)),
-                                        length_as_pixels(element.attrib.get('y', 0))))
+            x = length_as_pixels(element.attrib.get('x', 0))
+            y = length_as_pixels(element.attrib.get('y', 0))
             if rx == 0 and ry == 0:
-                path = skia.Path.Rect((x, y, width, height))
+                path = skia.Path.Rect(skia.Rect.MakeXYWH(x, y, width, height))
             else:
-                path = skia.Path.RRect((x, y, width, height), rx, ry)
+                path = skia.Path.RRect(skia.Rect.MakeXYWH(x, y, width, height), rx, ry)
+            path = self.__transformed_path(path, T)
 
         elif element.tag == SVG_NS('line'):
             x1 = length_as_pixels(element.attrib.get('x1', 0))
             y1 = length_as_pixels(element.attrib.get('y1', 0))
             x2 = length_as_pixels(element.attrib.get('x2', 0))
             y2 = length_as_pixels(element.attrib.get('y2', 0))
-            path = self.__path_from_tokens(['M', x1, y1, x2, y2], T)
+            path = self.__path_from_segments(path_segments(['M', x1, y1, x2, y2]), T)
 
         elif element.tag == SVG_NS('polyline'):
             points = element.attrib.get('points', '').replace(',', ' ').split()
-            path = self.__path_from_tokens(['M'] + points, T)
+            path = self.__path_from_segments(path_segments(['M'] + points), T)
 
         elif element.tag == SVG_NS('polygon'):
-            points = element.attrib.get('points', '').replace(',', ' ').split()
-            skia_points = [skia.Point(*T.transform_point(points[n:n+2]))
-                                            for n in range(0, len(points), 2)]
+            points = np.array(element.attrib.get('points', '').replace(',', ' ').split(), dtype=float)
+            skia_points = [skia.Point(*pt) for pt in T.transform_points(points).tolist()]
             path = skia.Path.Polygon(skia_points, True)
 
         elif element.tag == SVG_NS('circle'):
             r = length_as_pixels(element.attrib.get('r', 0))
             if r == 0: return None
-            (cx, cy) = T.transform_point((length_as_pixels(element.attrib.get('cx', 0)),
-                                          length_as_pixels(element.attrib.get('cy', 0))))
-            path = skia.Path.Circle(cx, cy, r)
+            path = skia.Path.Circle(length_as_pixels(element.attrib.get('cx', 0)),
+                                    length_as_pixels(element.attrib.get('cy', 0)), r)
+            path = self.__transformed_path(path, T)
 
         elif element.tag == SVG_NS('ellipse'):
-            (rx, ry) = T.scale_length((length_as_pixels(element.attrib.get('rx', 0)),
-                                       length_as_pixels(element.attrib.get('ry', 0))))
+            rx = length_as_pixels(element.attrib.get('rx', 0))
+            ry = length_as_pixels(element.attrib.get('ry', 0))
             if rx == 0 or ry == 0: return None
-            (cx, cy) = T.transform_point((length_as_pixels(element.attrib.get('cx', 0)),
-                                          length_as_pixels(element.attrib.get('cy', 0))))
-            path = skia.Path.Oval((cx-rx, cy-ry, cx+rx, cy+ry))
+            cx = length_as_pixels(element.attrib.get('cx', 0))
+            cy = length_as_pixels(element.attrib.get('cy', 0))
+            path = skia.Path.Oval(skia.Rect.MakeLTRB(cx-rx, cy-ry, cx+rx, cy+ry))
+            path = self.__transformed_path(path, T)
 
         return path
 
-    def __path_from_tokens(self, tokens, transform):
-    #===============================================
+    def __path_from_segments(self, segments, transform):
+    #===================================================
         moved = False
-        first_point = None
-        current_point = None
-        closed = False
         path = skia.Path()
-        pos = 0
-        while pos < len(tokens):
-            if isinstance(tokens[pos], str) and tokens[pos].isalpha():
-                cmd = tokens[pos]
-                pos += 1
-            # Else repeat previous command with new coordinates
-            # with `moveTo` becoming `lineTo`
-            elif cmd == 'M':
-                cmd = 'L'
-            elif cmd == 'm':
-                cmd = 'l'
-
-            if cmd not in ['s', 'S']:
-                second_cubic_control = None
-            if cmd not in ['t', 'T']:
-                second_quad_control = None
-
-            if cmd in ['a', 'A']:
-                params = [float(x) for x in tokens[pos:pos+7]]
-                pos += 7
-                pt = params[5:7]
-                if cmd == 'a':
-                    pt[0] += current_point[0]
-                    pt[1] += current_point[1]
-                phi = radians(params[2])
+        for segment in segments:
+            cmd = segment[0]
+            if cmd == 'A':
+                (current_point, rx, ry, phi, large_arc_flag, sweep_flag, pt) = segment[1:]
                 if moved:
                     path.moveTo(*transform.transform_point(current_point))
                     moved = False
-                (rx, ry) = transform.scale_length(params[0:2])
-                path.arcTo(rx, ry, degrees(transform.rotate_angle(phi)),
-                    skia.Path.ArcSize.kSmall_ArcSize if params[3] == 0
+                (rx, ry) = transform.scale_length((rx, ry))
+                path.arcTo(rx, ry, degrees(transform.rotate_angle(radians(phi))),
+                    skia.Path.ArcSize.kSmall_ArcSize if large_arc_flag == 0
                         else skia.Path.ArcSize.kLarge_ArcSize,
-                    skia.PathDirection.kCCW if params[4] == 0
+                    skia.PathDirection.kCCW if sweep_flag == 0
                         else skia.PathDirection.kCW,
                     *transform.transform_point(pt))
-                current_point = pt
 
-            elif cmd in ['c', 'C', 's', 'S']:
+            elif cmd == 'C':
                 if moved:
-                    path.moveTo(*transform.transform_point(current_point))
+                    path.moveTo(*transform.transform_point(segment[1]))
                     moved = False
-                if cmd in ['c', 'C']:
-                    n_params = 6
-                    coords = []
-                else:
-                    n_params = 4
-                    if second_cubic_control is None:
-                        coords = list(transform.transform_point(current_point))
-                    else:
-                        coords = list(transform.transform_point(
-                                    reflect_point(second_cubic_control, current_point)))
-                params = [float(x) for x in tokens[pos:pos+n_params]]
-                pos += n_params
-                for n in range(0, n_params, 2):
-                    pt = params[n:n+2]
-                    if cmd.islower():
-                        pt[0] += current_point[0]
-                        pt[1] += current_point[1]
-                    if n == (n_params - 4):
-                        second_cubic_control = pt
-                    coords.extend(transform.transform_point(pt))
-                path.cubicTo(*coords)
-                current_point = pt
-
-            elif cmd in ['l', 'L', 'h', 'H', 'v', 'V']:
-                if cmd in ['l', 'L']:
-                    params = [float(x) for x in tokens[pos:pos+2]]
-                    pos += 2
-                    pt = params[0:2]
-                    if cmd == 'l':
-                        pt[0] += current_point[0]
-                        pt[1] += current_point[1]
-                else:
-                    param = float(tokens[pos])
-                    pos += 1
-                    if cmd == 'h':
-                        param += current_point[0]
-                    elif cmd == 'v':
-                        param += current_point[1]
-                    if cmd in ['h', 'H']:
-                        pt = [param, current_point[1]]
-                    else:
-                        pt = [current_point[0], param]
+                path.cubicTo(*transform.transform_points(segment[2:]).flatten().tolist())
+
+            elif cmd == 'L':
                 if moved:
-                    path.moveTo(*transform.transform_point(current_point))
+                    path.moveTo(*transform.transform_point(segment[1]))
                     moved = False
-                path.lineTo(*transform.transform_point(pt))
-                current_point = pt
-
-            elif cmd in ['m', 'M']:
-                params = [float(x) for x in tokens[pos:pos+2]]
-                pos += 2
-                pt = params[0:2]
-                if first_point is None:
-                    # First `m` in a path is treated as `M`
-                    first_point = pt
-                else:
-                    if cmd == 'm':
-                        pt[0] += current_point[0]
-                        pt[1] += current_point[1]
-                current_point = pt
+                path.lineTo(*transform.transform_point(segment[2]))
+
+            elif cmd == 'M':
                 moved = True
 
-            elif cmd in ['q', 'Q', 't', 'T']:
+            elif cmd == 'Q':
                 if moved:
-                    path.moveTo(*transform.transform_point(current_point))
+                    path.moveTo(*transform.transform_point(segment[1]))
                     moved = False
-                if cmd in ['t', 'T']:
-                    n_params = 4
-                    coords = []
-                else:
-                    n_params = 2
-                    if second_quad_control is None:
-                        coords = list(transform.transform_point(current_point))
-                    else:
-                        coords = list(transform.transform_point(
-                                    reflect_point(second_quad_control, current_point)))
-                params = [float(x) for x in tokens[pos:pos+n_params]]
-                pos += n_params
-                for n in range(0, n_params, 2):
-                    pt = params[n:n+2]
-                    if cmd.islower():
-                        pt[0] += current_point[0]
-                        pt[1] += current_point[1]
-                    if n == (n_params - 4):
-                        second_quad_control = pt
-                    coords.extend(transform.transform_point(pt))
-                path.quadTo(*coords)
-                current_point = pt
-
-            elif cmd in ['z', 'Z']:
-                if first_point is not None and current_point != first_point:
-                    pass
-                    #path.close()
-                closed = True
-                first_point = None
+                path.quadTo(*transform.transform_points(segment[2:]).flatten().tolist())
 
-            else:
-                print('Unknown path command: {}'.format(cmd))
         return path
 
 #===============================================================================
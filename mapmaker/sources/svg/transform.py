@@ -18,6 +18,7 @@
 #
 #===============================================================================
 
+from functools import lru_cache
 from math import sin, cos, tan
 
 #===============================================================================
@@ -30,71 +31,105 @@ from mapmaker.geometry import radians, Transform
 
 #===============================================================================
 
-class SVGTransform(Transform):
-    def __init__(self, transform):
-        T = np.identity(3)
-        if transform is not None:
-            # A simple parser, assuming well-formed SVG
-            tokens = transform.replace('(', ' ').replace(')', ' ').replace(',', ' ').split()
-            pos = 0
-            while pos < len(tokens):
-                xfm = tokens[pos]
+@lru_cache(maxsize=None)
+def transform_matrix(transform):
+#================================
+    """
+    Parse an SVG ``transform`` attribute. Results are cached as the same
+    attribute values recur throughout a document.
+
+    :rtype: :class:`numpy.ndarray` of shape ``(3, 3)``
+    """
+    T = np.identity(3)
+    if transform is not None:
+        # A simple parser, assuming well-formed SVG
+        tokens = transform.replace('(', ' ').replace(')', ' ').replace(',', ' ').split()
+        pos = 0
+        while pos < len(tokens):
+            xfm = tokens[pos]
+            pos += 1
+            if xfm == 'matrix':
+                params = tuple(float(x) for x in tokens[pos:pos+6])
+                pos += 6
+                T = T@np.array([[params[0], params[2], params[4]],
+                                [params[1], params[3], params[5]],
+                                [        0,         0,         1]])
+            elif xfm == 'translate':
+                x = float(tokens[pos])
                 pos += 1
-                if xfm == 'matrix':
-                    params = tuple(float(x) for x in tokens[pos:pos+6])
-                    pos += 6
-                    T = T@np.array([[params[0], params[2], params[4]],
-                                    [params[1], params[3], params[5]],
-                                    [        0,         0,         1]])
-                elif xfm == 'translate':
-                    x = float(tokens[pos])
-                    pos += 1
-                    if pos >= len(tokens) or tokens[pos].isalpha():
-                        y = 0
-                    else:
-                        y = float(tokens[pos])
-                        pos += 1
-                    T = T@np.array([[1, 0, x],
-                                    [0, 1, y],
-                                    [0, 0, 1]])
-                elif xfm == 'scale':
-                    sx = float(tokens[pos])
-                    pos += 1
-                    if pos >= len(tokens) or tokens[pos].isalpha():
-                        sy = sx
-                    else:
-                        sy = float(tokens[pos])
-                        pos += 1
-                    T = T@np.array([[sx,  0, 0],
-                                    [ 0, sy, 0],
-                                    [ 0,  0, 1]])
-                elif xfm == 'rotate':
-                    a = radians(float(tokens[pos]))
-                    pos += 1
-                    if pos >= len(tokens) or tokens[pos].isalpha():
-                        T = T@np.array([[cos(a), -sin(a), 0],
-                                        [sin(a),  cos(a), 0],
-                                        [     0,       0, 1]])
-                    else:
-                        (cx, cy) = tuple(float(x) for x in tokens[pos:pos+2])
-                        pos += 2
-                        T = T@np.array([[cos(a), -sin(a), -cx*cos(a) + cy*sin(a) + cx],
-                                        [sin(a),  cos(a), -cx*sin(a) - cy*cos(a) + cy],
-                                        [     0,       0,                           1]])
-                elif xfm == 'skewX':
-                    a = float(tokens[pos])
+                if pos >= len(tokens) or tokens[pos].isalpha():
+                    y = 0
+                else:
+                    y = float(tokens[pos])
                     pos += 1
-                    T = T@np.array([[1, tan(a), 0],
-                                    [0,      1, 0],
-                                    [0,      0, 1]])
-                elif xfm == 'skewY':
-                    a = float(tokens[pos])
+                T = T@np.array([[1, 0, x],
+                                [0, 1, y],
+                                [0, 0, 1]])
+            elif xfm == 'scale':
+                sx = float(tokens[pos])
+                pos += 1
+                if pos >= len(tokens) or tokens[pos].isalpha():
+                    sy = sx
+                else:
+                    sy = float(tokens[pos])
                     pos += 1
-                    T = T@np.array([[     1, 0, 0],
-                                    [tan(a), 1, 0],
-                                    [     0, 0, 1]])
+                T = T@np.array([[sx,  0, 0],
+                                [ 0, sy, 0],
+                                [ 0,  0, 1]])
+            elif xfm == 'rotate':
+                a = radians(float(tokens[pos]))
+                pos += 1
+                if pos >= len(tokens) or tokens[pos].isalpha():
+                    T = T@np.array([[cos(a), -sin(a), 0],
+                                    [sin(a),  cos(a), 0],
+                                    [     0,       0, 1]])
                 else:
-                    raise ValueError('Invalid SVG transform: {}'.format(transform))
-        super().__init__(T)
+                    (cx, cy) = tuple(float(x) for x in tokens[pos:pos+2])
+                    pos += 2
+                    T = T@np.array([[cos(a), -sin(a), -cx*cos(a) + cy*sin(a) + cx],
+                                    [sin(a),  cos(a), -cx*sin(a) - cy*cos(a) + cy],
+                                    [     0,       0,                           1]])
+            elif xfm == 'skewX':
+                a = float(tokens[pos])
+                pos += 1
+                T = T@np.array([[1, tan(a), 0],
+                                [0,      1, 0],
+                                [0,      0, 1]])
+            elif xfm == 'skewY':
+                a = float(tokens[pos])
+                pos += 1
+                T = T@np.array([[     1, 0, 0],
+                                [tan(a), 1, 0],
+                                [     0, 0, 1]])
+            else:
+                raise ValueError('Invalid SVG transform: {}'.format(transform))
+    T.flags.writeable = False
+    return T
+
+#===============================================================================
+
+class SVGTransform(Transform):
+    def __init__(self, transform):
+        super().__init__(transform_matrix(transform))
+
+#===============================================================================
+
+def compose_transform(transform, svg_transform):
+#===============================================
+    """
+    Compose a parent's transform with an element's ``transform`` attribute.
+
+    Elements without a ``transform`` attribute share their parent's
+    transform, along with its cached decomposition.
+
+    :param transform: the parent's transform
+    :type transform: :class:`~mapmaker.geometry.Transform`
+    :param svg_transform: the value of the element's ``transform`` attribute
+    :type svg_transform: str
+    :rtype: :class:`~mapmaker.geometry.Transform`
+    """
+    if svg_transform is None:
+        return transform
+    return transform@SVGTransform(svg_transform)
 
 #===============================================================================
@@ -23,6 +23,10 @@ import string
 
 #===============================================================================
 
+from lxml import etree
+
+#===============================================================================
+
 from .. import PIXELS_PER_INCH
 
 #===============================================================================
@@ -32,6 +36,38 @@ def SVG_NS(tag):
 
 #===============================================================================
 
+def iterparse_svg(source):
+#=========================
+    """
+    Parse an SVG document incrementally.
+
+    The document's root element is yielded first, as soon as its attributes
+    are known, followed by each of the root's children once it has been
+    completely parsed. A child is cleared and removed from the document when
+    the next element is asked for, so that only one top-level element is held
+    in memory at a time. Elements that a caller keeps references to (for
+    instance definitions) remain usable.
+
+    :param source: a file name or file object
+    """
+    root = None
+    depth = 0
+    for (event, element) in etree.iterparse(source, events=('start', 'end')):
+        if event == 'start':
+            if depth == 0:
+                root = element
+                yield root
+            depth += 1
+        else:
+            depth -= 1
+            if depth == 1:
+                yield element
+                element.clear()
+                while element.getprevious() is not None:
+                    del root[0]
+
+#===============================================================================
+
 CM_PER_INCH = 2.54
 MM_PER_INCH = 10*CM_PER_INCH
 